@@ -3,27 +3,18 @@ from dotenv import load_dotenv
 
 load_dotenv()
 import os
-import google.generativeai as genai
-from youtube_transcript_api import YouTubeTranscriptApi
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from gensim import corpora, models
+from gemini_utils import configure_gemini, get_model, generate_text
+from transcript_store import get_store
+import text_rank
+from map_reduce_summary import summarize_long_transcript
+from topic_service import get_topic_service, make_documents
 from collections import defaultdict
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import sent_tokenize, word_tokenize
-from nltk.downloader import Downloader
+from video_batch import parse_video_id, collect_video_ids, summarize_videos, make_bundle, MAX_WORKERS
+# NLTK data is installed at deploy time (python nlp_resources.py); tokenizers and
+# stop words are loaded on first use and cached for the whole process
+from nlp_resources import sent_tokenize, sentence_word_tokenize, get_stop_words, missing_resources
 
-downloader = Downloader()
-
-nltk.download('punkt')
-nltk.download('stopwords')
-if not downloader.is_installed('punkt_tab'):
-  nltk.download('punkt_tab')
-
-stop_words = set(stopwords.words('english'))
-
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+configure_gemini()
 
 
 prompt = """You are YouTube video summarizer. You will be taking the transcript text
@@ -32,85 +23,37 @@ within 550 words. Please provide the summary of the text given here:  """
 
 
 def extract_transcript_details(youtube_video_url):
-    try:
-        video_id = youtube_video_url.split("=")[1]
-        transcript_text = YouTubeTranscriptApi.get_transcript(video_id)
-        transcript = ""
-        for i in transcript_text:
-            transcript += " " + i["text"]
-        return transcript
-    except Exception as e:
-        raise e
-
-# Function to vectorize a sentence
-def vectorize_sentence(sentence, max_length):
-    tokens = word_tokenize(sentence)
-    filtered_tokens = [token.lower() for token in tokens if token.isalnum() and token.lower() not in stop_words]
-    
-    vector = np.zeros(max_length) #This is a fixed size numpy vector
-    for i, token in enumerate(filtered_tokens):
-      if i< max_length:
-        vector[i] = 1
-    return vector
-    
-# Function to calculate sentence similarity using cosine similarity
-def calculate_sentence_similarity(sentence1, sentence2, max_length):
-    vec1 = vectorize_sentence(sentence1, max_length).reshape(1, -1)
-    vec2 = vectorize_sentence(sentence2, max_length).reshape(1, -1)
-    
-    if np.count_nonzero(vec1) == 0 or np.count_nonzero(vec2) == 0: #handle cases with empty vectors
-      return 0
-    similarity = cosine_similarity(vec1, vec2)[0][0]
-    return similarity
-
-
-# Function to select most representative sentences
+    video_id = parse_video_id(youtube_video_url)
+    if video_id is None:
+        st.error("That does not look like a YouTube video link.")
+        return None
+    # Served from the persistent transcript store; concurrent requests share one download
+    return get_store().get(video_id)
+
+# Function to select most representative sentences (TextRank over sparse TF-IDF vectors)
 def select_representative_sentences(transcript_text, n_sentences=5):
-  sentences = sent_tokenize(transcript_text)
-  if len(sentences) <= n_sentences:
-    return sentences
-  
-  all_tokens = [word_tokenize(sent) for sent in sentences]
-  filtered_tokens = [ [token.lower() for token in tokens if token.isalnum() and token.lower() not in stop_words] for tokens in all_tokens]
-  max_length = max(len(tokens) for tokens in filtered_tokens)
-
-  sentence_vectors = [vectorize_sentence(sent, max_length) for sent in sentences]
-
-
-  # create a matrix for efficient similarity comparison
-  matrix = np.array(sentence_vectors)
-    # compute the cosine similarity matrix for all the sentences
-  similarity_matrix = cosine_similarity(matrix)
-    
-    #compute the average score for each sentence in the corpus
-  sentence_scores = np.sum(similarity_matrix, axis=1)
-
-  ranked_sentence_indices = np.argsort(sentence_scores)[::-1]
-
-    #extract the top sentences
-  top_sentences = [sentences[i] for i in ranked_sentence_indices[:n_sentences]]
-  return top_sentences
+    return text_rank.select_representative_sentences(
+        transcript_text, n_sentences,
+        sent_tokenize=sent_tokenize, word_tokenize=sentence_word_tokenize, stop_words=get_stop_words()
+    )
+
 def resolve_coreferences(text):
     return text
 
 # Function for abstractive summarization using Gemini Pro
 def generate_gemini_summary(transcript_text, prompt):
-    model = genai.GenerativeModel("gemini-pro")
-    response = model.generate_content(prompt + transcript_text)
-    return response.text
-
-# Function to perform topic modeling using gensim
-def perform_topic_modeling(transcript_text, num_topics=3):
-    # Tokenize and remove stopwords
-    tokens = [word.lower() for word in word_tokenize(transcript_text) if word.isalpha() and word.lower() not in stop_words]
-
-    #Create dictionary of tokens
-    dictionary = corpora.Dictionary([tokens])
-    corpus = [dictionary.doc2bow(tokens)]
-    
-    # Train LDA
-    lda_model = models.LdaModel(corpus=corpus, num_topics=num_topics, id2word=dictionary, random_state=100, update_every=1, chunksize=100, passes=10, alpha='auto', per_word_topics=True)
-    topics = lda_model.print_topics(num_words=5)
+    model = get_model("gemini-pro")
+    return generate_text(model, prompt + transcript_text)
+
+# Function to perform topic modeling with the shared online LDA model
+def perform_topic_modeling(transcript_text, video_id=None, num_topics=3):
+    # Sentence windows of content words are the LDA documents
+    documents = make_documents(transcript_text, sent_tokenize, sentence_word_tokenize, get_stop_words())
+
+    # Inference against the persisted model; a video not seen before is folded into it in the background
+    topic_service = get_topic_service()
+    topics = topic_service.topics_for(documents, num_topics=num_topics, num_words=5)
+    topic_service.update_async(video_id, documents)
 
     return topics
 
@@ -120,7 +63,7 @@ def perform_ner(transcript_text):
 
 
 # Main function for generating summaries
-def generate_enhanced_summary(transcript_text):
+def generate_enhanced_summary(transcript_text, full_transcript=False, on_chunk_done=None, video_id=None):
     # 1. Sentence Selection based on Similarity
     representative_sentences = select_representative_sentences(transcript_text)
     representative_sentences_text = " ".join(representative_sentences)
@@ -129,10 +72,17 @@ def generate_enhanced_summary(transcript_text):
     resolved_text = resolve_coreferences(representative_sentences_text)
 
     #3. Abstractive Summarization
-    abstractive_summary = generate_gemini_summary(resolved_text, prompt)
+    if full_transcript:
+        # Map-reduce over the whole transcript: chunk summaries in parallel, then one final summary
+        abstractive_summary = summarize_long_transcript(
+            transcript_text, prompt, model=get_model("gemini-pro"),
+            sent_tokenize=sent_tokenize, on_chunk_done=on_chunk_done
+        )["summary"]
+    else:
+        abstractive_summary = generate_gemini_summary(resolved_text, prompt)
 
     # 4. Topic Modeling
-    topics = perform_topic_modeling(transcript_text)
+    topics = perform_topic_modeling(transcript_text, video_id)
 
     #5. Named Entity Recognition
     entities = perform_ner(transcript_text)
@@ -156,14 +106,34 @@ st.markdown("<hr style='border: 3px solid green;'>", unsafe_allow_html=True)
 youtube_link = st.text_input("Enter YouTube Video Link:")
 
 if youtube_link:
-    video_id = youtube_link.split("=")[1]
-    st.image(f"http://img.youtube.com/vi/{video_id}/0.jpg", use_column_width=True)
+    video_id = parse_video_id(youtube_link)
+    if video_id:
+        st.image(f"http://img.youtube.com/vi/{video_id}/0.jpg", use_column_width=True)
 
 
+summary_mode = st.radio("Summary mode",
+                        options=["Quick (key sentences)", "Full transcript (best for long lectures)"],
+                        horizontal=True)
+full_transcript = summary_mode.startswith("Full")
+
 if st.button("Get Detailed Notes"):
+    missing = missing_resources()
+    if missing:
+        st.error(f"Missing NLTK data: {', '.join(missing)}. Run `python nlp_resources.py` on the server.")
+        st.stop()
     transcript_text = extract_transcript_details(youtube_link)
     if transcript_text:
-        enhanced_summary = generate_enhanced_summary(transcript_text)
+        progress_bar = st.progress(0.0) if full_transcript else None
+
+        def on_chunk_done(done, total):
+            progress_bar.progress(done / total, text=f"Summarized part {done} of {total}")
+
+        with st.spinner("Generating notes..."):
+            enhanced_summary = generate_enhanced_summary(transcript_text, full_transcript,
+                                                         on_chunk_done if full_transcript else None,
+                                                         video_id=parse_video_id(youtube_link))
+        if progress_bar:
+            progress_bar.empty()
 
         st.markdown("## 📝 Detailed Notes:")
         st.markdown("### Abstractive Summary:")
@@ -176,6 +146,46 @@ if st.button("Get Detailed Notes"):
         st.write(enhanced_summary["entities"])
 
 
+# Batch mode: whole playlists, lists of links or a CSV of links
+st.markdown("<hr style='border: 3px solid green;'>", unsafe_allow_html=True)
+st.subheader("📚 Batch Notes for a Course")
+
+batch_links = st.text_area("Playlist or video links (one per line):")
+batch_csv = st.file_uploader("...or a CSV with a url / video_id column", type=["csv"])
+
+if st.button("Summarize All"):
+    missing = missing_resources()
+    if missing:
+        st.error(f"Missing NLTK data: {', '.join(missing)}. Run `python nlp_resources.py` on the server.")
+        st.stop()
+    video_ids, problems = collect_video_ids(batch_links, batch_csv.getvalue() if batch_csv else None)
+    for problem in problems:
+        st.warning(problem)
+
+    st.session_state.batch_results = []
+    if video_ids:
+        progress_bar = st.progress(0.0, text=f"Summarizing {len(video_ids)} videos, {MAX_WORKERS} at a time...")
+        # Results stream in as each video finishes, in completion order
+        for done, result in enumerate(summarize_videos(
+                video_ids, lambda transcript, video_id: generate_enhanced_summary(
+                    transcript, full_transcript, video_id=video_id)), start=1):
+            st.session_state.batch_results.append(result)
+            progress_bar.progress(done / len(video_ids), text=f"Finished {done} of {len(video_ids)} videos")
+            if "error" in result:
+                st.error(f"{result['video_id']}: {result['error']}")
+            else:
+                with st.expander(f"{result['video_id']} ({result['seconds']:.0f} s)"):
+                    st.write(result["notes"]["abstractive_summary"])
+    elif not problems:
+        st.warning("Enter at least one playlist or video link.")
+
+# Kept in the session so the download survives the rerun that the button triggers
+if st.session_state.get("batch_results"):
+    results = st.session_state.batch_results
+    succeeded = sum("notes" in result for result in results)
+    st.download_button(f"Download notes ({succeeded} of {len(results)} videos)", make_bundle(results),
+                       file_name="course_notes.zip", mime="application/zip")
+
 # Add a green line before FAQ
 st.markdown("<hr style='border: 3px solid green;'>", unsafe_allow_html=True)
 
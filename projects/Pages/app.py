@@ -8,6 +8,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Import your login page
 from Pages import login
+from gemini_utils import get_cache_stats
 
 # Define your pages
 introduction = st.Page("introduction.py", title="Introduction", icon="📚")
@@ -26,6 +27,12 @@ def logout():
     st.session_state.logged_in = False
     st.rerun()
 
+# Optionally start loading the Stable Diffusion pipeline at startup so the first
+# image request doesn't pay the model load
+if os.getenv("SD_EAGER_WARMUP") == "1":
+    import sd_pipeline
+    sd_pipeline.warm_up()
+
 # Initialize session state for login status if not already set
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
@@ -47,5 +54,10 @@ if st.session_state.logged_in:
     with st.sidebar:
         if st.button("Logout"):
             logout()
+
+        # Response cache counters, to see how many Gemini calls were saved
+        stats = get_cache_stats()
+        st.caption(f"Gemini cache: {stats['hits']} hits / {stats['misses']} misses "
+                   f"({stats['hit_rate']:.0%}), ~{stats['saved_seconds']:.0f}s saved")
 else:
     login.app()
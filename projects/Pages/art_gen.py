@@ -1,14 +1,12 @@
 import os
+import time
 import streamlit as st
 from dotenv import load_dotenv
-from diffusers import StableDiffusionPipeline
-import torch
-from PIL import Image
-from io import BytesIO
+import sd_pipeline
+from generation_queue import get_queue
 
 # Load API key from .env
 load_dotenv()
-api_key = os.getenv("HUGGING_TOKEN")
 
 # Streamlit app configuration
 st.set_page_config(page_title="Text-to-Image Generator", layout="centered", page_icon=":art:")
@@ -33,40 +31,81 @@ st.markdown(neon_line, unsafe_allow_html=True)  # Neon Line after the heading
 # User input for image description
 user_prompt = st.text_area("Describe the image you want to generate:", height=150)
 
+# Generation settings; the fast CPU profile is the default on hosts without a GPU
+profile_keys = list(sd_pipeline.PROFILES)
+default_profile = sd_pipeline.default_profile()
+col1, col2 = st.columns(2)
+with col1:
+    profile = st.selectbox("Generation profile", options=profile_keys,
+                           index=profile_keys.index(default_profile),
+                           format_func=lambda key: sd_pipeline.PROFILES[key]["label"])
+    settings = sd_pipeline.PROFILES[profile]
+    size = st.select_slider("Resolution", options=[384, 512, 640, 768], value=settings["size"])
+with col2:
+    steps = st.slider("Steps", min_value=5, max_value=75, value=settings["steps"])
+    guidance_scale = st.slider("Guidance scale", min_value=1.0, max_value=15.0, value=settings["guidance_scale"], step=0.5)
+num_images = st.slider("Number of variations", min_value=1, max_value=get_queue().max_batch_images, value=1)
+seed = st.number_input("Seed", min_value=0, max_value=2**32 - 1, value=42, step=1,
+                       help="The same prompt, seed and settings give the same image, which is then served from the cache.")
+
 # Button to generate the image
 if st.button("Generate Image"):
     if not user_prompt.strip():
         st.error("Please enter a description!")
     else:
-        with st.spinner("Generating your image..."):
-            try:
-                # Load the Stable Diffusion model (version 2.1)
-                pipe = StableDiffusionPipeline.from_pretrained(
-                    "stabilityai/stable-diffusion-2-1",
-                    use_auth_token=api_key
-                )
-                pipe = pipe.to("cuda" if torch.cuda.is_available() else "cpu")
-
-                # Generate the image
-                image = pipe(user_prompt).images[0]
-
-                # Display the image
-                st.image(image, caption="Generated Image", use_column_width=True)
-
-                # Download Button
-                buf = BytesIO()
-                image.save(buf, format="PNG")
-                byte_im = buf.getvalue()
-
-                st.download_button(
-                    label="Download Image",
-                    data=byte_im,
-                    file_name="generated_image.png",
-                    mime="image/png"
-                )
-
-            except Exception as e:
-                st.error(f"An error occurred: {e}")
+        # A new request replaces this session's unfinished one instead of adding to the load
+        previous_job = get_queue().get(st.session_state.get("art_job_id"))
+        if previous_job:
+            get_queue().cancel(previous_job)
+
+        # Jobs from every session go through one shared queue, which batches compatible requests
+        job = get_queue().submit(user_prompt, num_images, profile, steps, guidance_scale, size, seed)
+        st.session_state.art_job_id = job.id
+
+# Follow the session's current job until it finishes, then show its images
+job = get_queue().get(st.session_state.get("art_job_id"))
+if job:
+    if not job.finished and st.button("Cancel", key=f"cancel_{job.id}"):
+        get_queue().cancel(job)
+
+    status_placeholder = st.empty()
+    progress_bar = st.progress(job.progress)
+    preview_placeholder = st.empty()
+    while not job.finished:
+        position = get_queue().position(job)
+        if position:
+            status_placeholder.info(f"Waiting in queue: position {position}")
+        elif not sd_pipeline.is_loaded(job.profile):
+            status_placeholder.info("Loading the model (first run only)...")
+        else:
+            status_placeholder.info(f"Generating your image... {job.progress:.0%}")
+        progress_bar.progress(job.progress)
+        if job.preview is not None:
+            preview_placeholder.image(job.preview, caption="Preview")
+        time.sleep(0.5)
+
+    status_placeholder.empty()
+    progress_bar.empty()
+    preview_placeholder.empty()
+    if job.status == "error":
+        st.error(f"An error occurred: {job.error}")
+    elif job.status == "cancelled":
+        st.warning("Image generation was cancelled.")
+    else:
+        cache_note = f", {job.cached} from cache" if job.cached else ""
+        st.caption(f"Generated in {job.finished_at - job.submitted_at:.1f}s ({job.steps} steps, {job.size}x{job.size}{cache_note})")
+        for i, byte_im in enumerate(job.images):
+            # Display the image
+            st.image(byte_im, caption=f"Generated Image (seed {job.seeds[i]})", use_column_width=True)
+
+            # Download Button
+            st.download_button(
+                label="Download Image",
+                data=byte_im,
+                file_name=f"generated_image_{i + 1}.png",
+                mime="image/png",
+                key=f"download_{job.id}_{i}"
+            )
 
 # FAQ Section using caching for stability
 @st.cache_data
@@ -0,0 +1,159 @@
+import json
+import numpy as np
+
+GRAPH_FENCE = "```json"
+# Largest graph block accepted; anything bigger is ignored rather than parsed.
+MAX_GRAPH_CHARS = 2_000_000
+MAX_POINTS = 200_000
+
+GRAPH_INSTRUCTIONS = """After the explanation, if the question involves numerical data or relationships suitable
+for a {chart_type} chart, add exactly one fenced block like this, with numbers as JSON numbers:
+```json
+{{"x": [...], "y": [...]}}
+```
+"x" and "y" must be lists of equal length; "y" must contain only numbers. If no graph is possible,
+leave the block out. Do not mention the block, making a graph or plotting in the explanation."""
+
+
+def _reject_constant(name):
+    raise ValueError(f"{name} is not allowed in graph data")
+
+
+_NUMBER_TYPES = (int, float)
+
+
+def _to_numbers(values, name):
+    """Converts a list of JSON numbers (booleans excluded) to a finite float64 array."""
+    # type() rather than isinstance(): bool is a subclass of int
+    if not all(type(value) in _NUMBER_TYPES for value in values):
+        raise ValueError(f"'{name}' must contain only numbers")
+    try:
+        array = np.asarray(values, dtype=np.float64)
+    except OverflowError:
+        raise ValueError(f"'{name}' contains a number that is too large")
+    if not np.isfinite(array).all():
+        raise ValueError(f"'{name}' contains a number that is too large")
+    return array
+
+
+def validate_graph_data(data):
+    """
+    Converts parsed {"x": [...], "y": [...]} data into arrays ready for plotting.
+
+    "y" must be finite numbers and becomes float64. "x" becomes float64 when it is all
+    numbers and a string array (categories) when it mixes in strings. Booleans, nulls,
+    nested values and out-of-range numbers raise ValueError.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("x"), list) or not isinstance(data.get("y"), list):
+        raise ValueError("graph data must be an object with 'x' and 'y' lists")
+    if len(data["x"]) != len(data["y"]):
+        raise ValueError("'x' and 'y' must have the same length")
+    if len(data["x"]) > MAX_POINTS:
+        raise ValueError(f"graph data has more than {MAX_POINTS} points")
+
+    y = _to_numbers(data["y"], "y")
+    x_types = {type(value) for value in data["x"]}
+    if x_types <= set(_NUMBER_TYPES):
+        x = _to_numbers(data["x"], "x")
+    elif x_types <= {int, float, str}:
+        x = np.asarray([str(value) for value in data["x"]])
+    else:
+        raise ValueError("'x' must contain only numbers or strings")
+    return {"x": x, "y": y}
+
+
+def extract_graph_data(text):
+    """
+    Splits the fenced ```json graph block off a model response and parses it.
+
+    The block is located with two substring searches and parsed once with the strict
+    json module (no NaN or Infinity); blocks over MAX_GRAPH_CHARS are not parsed.
+
+    Returns:
+        tuple: (text without the block, graph data dict from validate_graph_data or {}).
+    """
+    start = text.rfind(GRAPH_FENCE)
+    if start == -1:
+        return text, {}
+    end = text.find("```", start + len(GRAPH_FENCE))
+    if end == -1:
+        return text, {}
+    block = text[start + len(GRAPH_FENCE):end]
+    remaining = text[:start] + text[end + 3:]
+    if len(block) > MAX_GRAPH_CHARS:
+        print(f"Graph data block too large ({len(block)} characters), ignoring it")
+        return remaining, {}
+    try:
+        return remaining, validate_graph_data(json.loads(block, parse_constant=_reject_constant))
+    except ValueError as e:
+        print(f"Error while parsing graph data {e}")
+        return remaining, {}
+
+
+def as_plot_arrays(graph_data):
+    """
+    Converts graph data to arrays once and infers the chart kind from the dtypes.
+
+    Returns:
+        tuple: (x, y, numeric), where numeric is True when both x and y are numbers.
+    """
+    x = np.asarray(graph_data["x"])
+    y = np.asarray(graph_data["y"])
+    numeric = x.dtype.kind in "iuf" and y.dtype.kind in "iuf"
+    if numeric:
+        x, y = x.astype(np.float64), y.astype(np.float64)
+    return x, y, numeric
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept. The points in between are split into
+    threshold - 2 buckets, and each bucket keeps the point that forms the largest
+    triangle with the previously kept point and the average of the next bucket.
+    The triangle areas of a bucket are computed in one vectorised step. x must be
+    sorted; downsample() takes care of that.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+    return indices
+
+
+def downsample(x, y, max_points):
+    """
+    Downsamples a numeric series to at most max_points with LTTB, returning (x, y).
+
+    LTTB buckets points by position along x, so unsorted data (e.g. scatter points in
+    whatever order the model returned them) is sorted by x first.
+    """
+    if len(x) <= max_points:
+        return x, y
+    if np.any(x[1:] < x[:-1]):
+        order = np.argsort(x, kind="stable")
+        x, y = x[order], y[order]
+    keep = lttb_indices(x, y, max_points)
+    return x[keep], y[keep]
+
+
+def top_categories(x, y, max_categories, other_label="Other"):
+    """Keeps the max_categories - 1 largest categories and sums the rest into other_label."""
+    if len(x) <= max_categories:
+        return x, y
+    keep = np.sort(np.argpartition(-y, max_categories - 2)[:max_categories - 1])
+    rest = np.ones(len(y), dtype=bool)
+    rest[keep] = False
+    return np.append(x[keep].astype(object), other_label), np.append(y[keep], y[rest].sum())
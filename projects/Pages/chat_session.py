@@ -0,0 +1,137 @@
+import os
+from gemini_utils import get_model, call_gemini, generate_text
+from map_reduce_summary import estimate_tokens
+
+# History above this many (estimated) tokens is compacted into a rolling summary.
+HISTORY_TOKEN_BUDGET = int(os.getenv("QA_HISTORY_TOKENS", "4000"))
+# Most recent question/answer pairs always kept verbatim.
+KEEP_TURNS = int(os.getenv("QA_KEEP_TURNS", "2"))
+
+SUMMARY_PROMPT = """Summarize the conversation below between a user and an assistant so it can
+continue without the full transcript. Keep every fact, number, name and document detail that a
+follow-up question might need, and the user's goals and preferences. Use at most 300 words.
+
+"""
+
+
+def _text(content):
+    """Text of a history entry (a Content proto or a {"role", "parts"} dict)."""
+    parts = content["parts"] if isinstance(content, dict) else [part.text for part in content.parts]
+    return " ".join(str(part) for part in parts)
+
+
+def _role(content):
+    return content["role"] if isinstance(content, dict) else content.role
+
+
+class ChatSession:
+    """
+    One user's multi-turn conversation with Gemini about one document.
+
+    The underlying chat is reused across questions, so document passages already sent
+    stay in the history and are not sent again. When the history grows past
+    token_budget, everything except the last keep_turns exchanges is replaced by a
+    rolling summary, which keeps the tokens per follow-up bounded.
+
+    The history of the last complete exchange is kept aside: if a stream is cut off
+    (e.g. by a Streamlit rerun), blocked or fails partway, the library's chat history
+    becomes unusable and the chat is rebuilt from that copy.
+    """
+
+    def __init__(self, document_key=None, model_name="gemini-pro",
+                 token_budget=HISTORY_TOKEN_BUDGET, keep_turns=KEEP_TURNS):
+        self.document_key = document_key
+        self.model = get_model(model_name)
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary = ""
+        self.turns = 0
+        self.last_prompt_tokens = 0
+        # Passage id -> turn it was sent in; forgotten when that turn is compacted
+        self._sent = {}
+        self._history = []
+        self._chat = self.model.start_chat(history=[])
+
+    def new_passages(self, passages):
+        """Returns the (id, text) passages that have not been sent in this conversation yet."""
+        return [(passage_id, text) for passage_id, text in passages if passage_id not in self._sent]
+
+    def history_tokens(self):
+        return sum(estimate_tokens(_text(content)) for content in self._history)
+
+    def _restore(self):
+        """Drops a broken or unfinished exchange by rebuilding the chat from the last complete history."""
+        self._chat = self.model.start_chat(history=list(self._history))
+
+    def ask(self, question, passages=()):
+        """
+        Sends a question with only the passages the conversation has not seen, streaming the answer.
+
+        Args:
+            question (str): The user's question (already including any web results or language instruction).
+            passages (list): (id, text) document passages relevant to the question.
+
+        Yields:
+            The streamed response chunks. History is compacted once the stream is consumed.
+        """
+        new = self.new_passages(passages)
+        if new:
+            context = "\n\n".join(text for _, text in new)
+            message = f"Context: {context}\n\nUser Question: {question}"
+        elif passages:
+            message = f"(The relevant document context was given earlier in this conversation.)\n\nUser Question: {question}"
+        else:
+            message = question
+
+        self.last_prompt_tokens = self.history_tokens() + estimate_tokens(message)
+        response = call_gemini(self.model, lambda: self._chat.send_message(message, stream=True))
+        if response is None:
+            self._restore()
+            return
+
+        completed = False
+        try:
+            yield from response
+            completed = True
+        finally:
+            # Cut off by a rerun or failed partway: forget the unfinished exchange
+            if not completed:
+                self._restore()
+        try:
+            self._history = list(self._chat.history)
+        except Exception as e:
+            # e.g. the answer was stopped by a safety block
+            print(f"Chat exchange could not be added to the history, discarding it: {e}")
+            self._restore()
+            return
+
+        # Only a complete exchange counts as a turn that delivered its passages
+        self.turns += 1
+        for passage_id, _ in new:
+            self._sent[passage_id] = self.turns
+        self.compact()
+
+    def compact(self):
+        """Folds older exchanges into the rolling summary if the history is over budget."""
+        history = self._history
+        keep = 2 * self.keep_turns
+        if self.history_tokens() <= self.token_budget or len(history) <= keep:
+            return
+        older, recent = history[:-keep], history[-keep:]
+        transcript = "\n\n".join(f"{_role(content)}: {_text(content)}" for content in older)
+        try:
+            self.summary = generate_text(self.model, SUMMARY_PROMPT + transcript)
+        except Exception as e:
+            print(f"Error compacting chat history: {e}")
+            return
+
+        # The summary replaces the older turns (including any earlier summary) as the opening exchange
+        opening = [
+            {"role": "user", "parts": [f"Summary of our conversation so far:\n{self.summary}"]},
+            {"role": "model", "parts": ["Understood. I will use this summary as context."]},
+        ]
+        self._history = opening + recent
+        self._chat = self.model.start_chat(history=list(self._history))
+        # Passages sent in compacted turns are no longer verbatim in the history
+        first_kept_turn = self.turns - self.keep_turns + 1
+        self._sent = {pid: turn for pid, turn in self._sent.items() if turn >= first_kept_turn}
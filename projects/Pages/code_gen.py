@@ -1,24 +1,21 @@
 import os
 from dotenv import load_dotenv
 import streamlit as st 
-import google.generativeai as genai
 import tempfile
+from gemini_utils import configure_gemini, get_model, generate_text
 
 # Load environment variables
 load_dotenv()
 
 # Configure the Google Generative AI API
-api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
+if not configure_gemini():
     st.error("API Key not found. Please set it in the .env file.")
-else:
-    genai.configure(api_key=api_key)
 
 # --- Helper Functions ---
 def load_model():
-    """Loads the Gemini 1.5 Pro model."""
+    """Returns the shared Gemini model handle."""
     try:
-        return genai.GenerativeModel('gemini-2.0-flash-exp')
+        return get_model('gemini-2.0-flash-exp')
     except Exception as e:
         st.error(f"Error loading the model: {e}")
         return None
@@ -45,8 +42,7 @@ def generate_code(model, prompt, language="python", code_style=""):
         # Add language and code style specifier to prompt for better results
         full_prompt = f"Generate {language} code using {code_style} for the following: {prompt}" if code_style else f"Generate {language} code for the following: {prompt}"
 
-        response = model.generate_content(full_prompt)
-        generated_code = response.text
+        generated_code = generate_text(model, full_prompt)
 
         if generated_code:
             return generated_code, None
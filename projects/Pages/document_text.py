@@ -0,0 +1,103 @@
+import io
+import os
+import threading
+from retrieval import document_key
+
+# Extracted text of uploads, one <sha256>.txt per file: a page-count line, then the
+# pages separated by form feeds.
+TEXT_CACHE_DIR = os.getenv("QA_TEXT_CACHE_DIR", "document_text_cache")
+# Least recently used files are removed once the directory grows past this size.
+TEXT_CACHE_MAX_BYTES = int(os.getenv("QA_TEXT_CACHE_MB", "256")) * 1024 * 1024
+PAGE_BREAK = "\f"
+# Characters read at a time from a cache file.
+READ_BLOCK = 64 * 1024
+
+_evict_lock = threading.Lock()
+
+
+def iter_pdf_pages(data):
+    """
+    Yields (page_number, page_count, text) for each page of a PDF, one page at a time.
+
+    pypdf parses page content lazily, so only the current page's text is held in memory.
+    """
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+    for number, page in enumerate(reader.pages, start=1):
+        yield number, page_count, (page.extract_text() or "").replace(PAGE_BREAK, " ")
+
+
+def iter_text_pages(data, encoding="utf-8"):
+    """Yields a plain-text file as a single page."""
+    yield 1, 1, data.decode(encoding, errors="replace").replace(PAGE_BREAK, " ")
+
+
+def _cached_pages(path):
+    """Streams the pages of a cache file, holding one page (plus one read block) in memory."""
+    with open(path, encoding="utf-8", newline="") as f:
+        page_count = int(f.readline())
+        number, parts = 1, []
+        for block in iter(lambda: f.read(READ_BLOCK), ""):
+            pieces = block.split(PAGE_BREAK)
+            parts.append(pieces[0])
+            for piece in pieces[1:]:
+                yield number, page_count, "".join(parts)
+                number, parts = number + 1, [piece]
+        yield number, page_count, "".join(parts)
+
+
+def _evict(cache_dir, max_bytes):
+    """Removes the least recently used cache files until the directory fits in max_bytes."""
+    with _evict_lock:
+        entries, total = [], 0
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith(".txt"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= max_bytes:
+                break
+
+
+def iter_document_pages(filename, data, cache_dir=TEXT_CACHE_DIR, max_bytes=TEXT_CACHE_MAX_BYTES):
+    """
+    Yields (page_number, page_count, text) for an uploaded txt or pdf file.
+
+    Extracted text is cached on disk by the hash of the file, so an upload that was
+    seen before is not parsed again; cached pages are streamed back one at a time.
+    The cache file is only written once every page has been extracted; an interrupted
+    extraction leaves nothing behind. Reads refresh a file's mtime, and writes evict
+    the least recently used files once the directory grows past max_bytes.
+    """
+    path = os.path.join(cache_dir, f"{document_key(data)}.txt")
+    if os.path.exists(path):
+        os.utime(path, None)
+        yield from _cached_pages(path)
+        return
+
+    pages = iter_pdf_pages(data) if filename.lower().endswith(".pdf") else iter_text_pages(data)
+    os.makedirs(cache_dir, exist_ok=True)
+    partial_path = f"{path}.{os.getpid()}.partial"
+    try:
+        with open(partial_path, "w", encoding="utf-8", newline="") as f:
+            for number, page_count, text in pages:
+                if number == 1:
+                    f.write(f"{page_count}\n")
+                else:
+                    f.write(PAGE_BREAK)
+                f.write(text)
+                yield number, page_count, text
+        os.replace(partial_path, path)
+        _evict(cache_dir, max_bytes)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
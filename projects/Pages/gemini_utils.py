@@ -1,32 +1,192 @@
 import os
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import google.generativeai as genai
 from dotenv import load_dotenv
 from PIL import Image
-import io
+from response_cache import ResponseCache, make_cache_key
+from rate_limit import call_with_retry
+from image_payload import prepare_image
 
-def configure_gemini():
-    """Configures the Gemini API using the environment variable."""
+# --- Process-wide client state ---
+# Streamlit re-executes every page script on each interaction, so anything
+# created at page level is rebuilt per click. The API configuration and the
+# GenerativeModel handles live here instead and are shared by all sessions.
+_configure_lock = threading.Lock()
+_configured_key = None
+
+_models_lock = threading.Lock()
+_models = {}
+_model_keys = {}
+
+# Identical prompts are answered from here instead of the API. Set GEMINI_CACHE_DB
+# to a file path to keep responses across restarts.
+load_dotenv()
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("GEMINI_CACHE_SIZE", "256")),
+    db_path=os.getenv("GEMINI_CACHE_DB") or None,
+    ttl_seconds=int(os.getenv("GEMINI_CACHE_TTL", str(7 * 24 * 3600))),
+)
+
+# Upper bound on parallel requests issued by get_gemini_responses.
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+
+def get_api_key():
+    """Returns the Gemini API key from the environment (GOOGLE_API_KEY or GOOGLE_API_KEYS)."""
     load_dotenv()
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        print("Error: GEMINI_API_KEY not found in environment variables.")
-        return False
-    
-    genai.configure(api_key=api_key)
+    return os.getenv("GOOGLE_API_KEY") or os.getenv("GOOGLE_API_KEYS")
+
+def configure_gemini():
+    """Configures the Gemini API once per process using the environment variable."""
+    global _configured_key
+    if _configured_key:
+        return True
+
+    with _configure_lock:
+        if _configured_key:
+            return True
+        api_key = get_api_key()
+        if not api_key:
+            print("Error: GOOGLE_API_KEY not found in environment variables.")
+            return False
+
+        genai.configure(api_key=api_key)
+        _configured_key = api_key
     return True
 
-def get_gemini_response(prompt, image):
+def _model_key(model_name, generation_config, system_instruction):
+    """Builds a hashable cache key for a model handle."""
+    config_key = json.dumps(generation_config, sort_keys=True, default=str) if generation_config else None
+    return (model_name, config_key, system_instruction)
+
+def get_model(model_name, generation_config=None, system_instruction=None):
+    """
+    Returns a cached GenerativeModel for the given name and generation config.
+
+    Args:
+        model_name (str): Gemini model name, e.g. "gemini-pro".
+        generation_config (dict, optional): Generation parameters passed to the model.
+        system_instruction (str, optional): System instruction for the model.
+
+    Returns:
+        genai.GenerativeModel: A handle shared by every caller with the same arguments.
+    """
+    configure_gemini()
+    key = _model_key(model_name, generation_config, system_instruction)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            kwargs = {}
+            if generation_config:
+                kwargs["generation_config"] = generation_config
+            if system_instruction:
+                kwargs["system_instruction"] = system_instruction
+            model = genai.GenerativeModel(model_name, **kwargs)
+            _models[key] = model
+            _model_keys[id(model)] = key
+    return model
+
+def call_gemini(model, request):
+    """Runs request() under the shared rate limiter for this API key and model, with retry/backoff."""
+    return call_with_retry(request, _configured_key, model.model_name)
+
+def generate_text(model, contents, use_cache=True):
+    """
+    Runs generate_content and returns the response text, answering repeated prompts from the response cache.
+
+    Args:
+        model: A model name or a handle returned by get_model.
+        contents: Prompt string, or a list of strings / bytes / {"mime_type", "data"} blobs.
+        use_cache (bool): Set to False to always call the API.
+
+    Returns:
+        str: The response text.
+    """
+    if isinstance(model, str):
+        model = get_model(model)
+
+    cache_key = None
+    if use_cache:
+        model_key = _model_keys.get(id(model), (model.model_name,))
+        cache_key = make_cache_key(model_key, contents)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    # Duration of the successful API call only, not the rate-limit wait or retry backoff
+    elapsed = 0.0
+
+    def request():
+        nonlocal elapsed
+        start = time.time()
+        response = model.generate_content(contents)
+        elapsed = time.time() - start
+        return response
+
+    response = call_gemini(model, request)
+    text = response.text if response else ""
+
+    if cache_key and text:
+        response_cache.set(cache_key, text, elapsed=elapsed)
+    return text
+
+def get_cache_stats():
+    """Returns hit/miss counters for the shared response cache."""
+    return response_cache.stats()
+
+def describe_image(prompt, image, source_bytes=None):
+    """
+    Generates a response for the prompt and image, after shrinking the image for upload.
+
+    Returns:
+        tuple: (response text, ImagePayload describing what was uploaded).
+    """
+    payload = prepare_image(image, source_bytes)
+    text = generate_text("gemini-pro-vision", [prompt, payload.as_blob()])
+    return text, payload
+
+def get_gemini_response(prompt, image, source_bytes=None):
     """Generates a response from the Gemini API for the given prompt and image."""
     try:
-        # Convert image to bytes
-        img_bytes = io.BytesIO()
-        image.save(img_bytes, format="PNG")
-        img_bytes = img_bytes.getvalue()
-        
-        # Create a request
-        model = genai.GenerativeModel("gemini-pro-vision")
-        response = model.generate_content([prompt, img_bytes])
-        
-        return response.text if response else "No response received."
+        text, _ = describe_image(prompt, image, source_bytes)
+        return text if text else "No response received."
     except Exception as e:
         return f"Error generating response: {e}"
+
+def get_gemini_responses(prompt, images, max_concurrency=None, sources=None):
+    """
+    Generates responses for several images concurrently.
+
+    Args:
+        prompt (str): Prompt sent with every image.
+        images (list): PIL images, in upload order.
+        max_concurrency (int, optional): Maximum requests in flight. Defaults to GEMINI_MAX_CONCURRENCY.
+        sources (list, optional): The uploaded file bytes for each image, so small files can be sent unchanged.
+
+    Yields:
+        tuple: (index, response, payload) in completion order; index is the image's position in images
+        and payload the ImagePayload that was uploaded. A failed request yields its error message
+        and a payload of None.
+    """
+    if not images:
+        return
+    sources = sources or [None] * len(images)
+
+    def run(image, source_bytes):
+        try:
+            text, payload = describe_image(prompt, image, source_bytes)
+            return (text if text else "No response received."), payload
+        except Exception as e:
+            return f"Error generating response: {e}", None
+
+    workers = max(1, min(max_concurrency or MAX_CONCURRENCY, len(images)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, image, source): i for i, (image, source) in enumerate(zip(images, sources))}
+        for future in as_completed(futures):
+            yield (futures[future],) + future.result()
@@ -0,0 +1,220 @@
+import itertools
+import os
+import threading
+import time
+from io import BytesIO
+import sd_pipeline
+from image_cache import ImageCache
+
+# Largest number of images run through the pipeline in one forward pass.
+MAX_BATCH_IMAGES = int(os.getenv("SD_MAX_BATCH", "4"))
+# Finished jobs are kept this long so their page can still show the results.
+JOB_TTL_SECONDS = 3600
+# Generated PNGs are cached on disk, keyed on prompt, seed and settings.
+CACHE_DIR = os.getenv("SD_CACHE_DIR", "sd_cache")
+CACHE_MAX_BYTES = int(os.getenv("SD_CACHE_MB", "512")) * 1024 * 1024
+# A low-resolution latent preview is decoded every this many steps.
+PREVIEW_EVERY = int(os.getenv("SD_PREVIEW_EVERY", "5"))
+
+
+class GenerationJob:
+    """One user request: a prompt, how many variations, and the generation settings."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, prompt, num_images, profile, steps, guidance_scale, size, seed):
+        self.id = next(self._ids)
+        self.prompt = prompt
+        self.num_images = num_images
+        self.profile = profile
+        self.steps = steps
+        self.guidance_scale = guidance_scale
+        self.size = size
+        # Variation i uses seed + i, so each image can be cached and reproduced on its own
+        self.seeds = [seed + i for i in range(num_images)]
+        self.status = "queued"  # queued -> running -> done / error / cancelled
+        self.progress = 0.0
+        self.preview = None  # small PIL image of the latest latents while running
+        self.cancel_requested = False
+        self.images = [None] * num_images  # PNG bytes, filled from the cache or the pipeline
+        self.cached = 0
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def batch_key(self):
+        """Jobs with the same key can share one pipeline call."""
+        return (self.profile, self.steps, self.guidance_scale, self.size)
+
+    @property
+    def missing(self):
+        """Indices of the images that still have to be generated."""
+        return [i for i, image in enumerate(self.images) if image is None]
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error", "cancelled")
+
+    def cache_key(self, index):
+        return ImageCache.make_key(
+            model=sd_pipeline.PROFILES[self.profile]["model"],
+            scheduler=sd_pipeline.PROFILES[self.profile]["scheduler"],
+            prompt=self.prompt,
+            seed=self.seeds[index],
+            steps=self.steps,
+            guidance_scale=self.guidance_scale,
+            size=self.size,
+        )
+
+
+class GenerationQueue:
+    """
+    Collects generation jobs from all sessions and runs them through the shared
+    pipeline in batches, on a single background worker thread.
+    """
+
+    def __init__(self, max_batch_images=MAX_BATCH_IMAGES, cache=None):
+        self.max_batch_images = max_batch_images
+        self.cache = cache
+        self._pending = []
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name="sd-queue", daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt, num_images=1, profile="quality", steps=None, guidance_scale=None, size=None, seed=0):
+        """Queues a job and returns it immediately; fully cached jobs come back already done."""
+        settings = sd_pipeline.PROFILES[profile]
+        job = GenerationJob(
+            prompt,
+            max(1, min(num_images, self.max_batch_images)),
+            profile,
+            steps or settings["steps"],
+            guidance_scale if guidance_scale is not None else settings["guidance_scale"],
+            size or settings["size"],
+            int(seed),
+        )
+        if self.cache is not None:
+            for i in range(job.num_images):
+                job.images[i] = self.cache.get(job.cache_key(i))
+            job.cached = job.num_images - len(job.missing)
+
+        with self._condition:
+            self._purge_finished()
+            self._jobs[job.id] = job
+            if job.missing:
+                self._pending.append(job)
+                self._condition.notify()
+            else:
+                job.progress = 1.0
+                job.status = "done"
+                job.finished_at = time.time()
+        return job
+
+    def get(self, job_id):
+        """Returns the job with this id, or None if it is unknown or expired."""
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job):
+        """Cancels a job: queued jobs are dropped, running ones stop at the next denoising step."""
+        with self._condition:
+            if job.finished:
+                return
+            job.cancel_requested = True
+            if job in self._pending:
+                self._pending.remove(job)
+                job.status = "cancelled"
+                job.finished_at = time.time()
+
+    def position(self, job):
+        """Returns the job's 1-based place in the queue, or 0 once it has started."""
+        with self._condition:
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return 0
+
+    def _next_batch(self):
+        """Takes the oldest pending job plus any compatible jobs that fit in the batch."""
+        first = self._pending.pop(0)
+        batch, total = [first], len(first.missing)
+        for job in list(self._pending):
+            if job.batch_key == first.batch_key and total + len(job.missing) <= self.max_batch_images:
+                self._pending.remove(job)
+                batch.append(job)
+                total += len(job.missing)
+        return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                batch = self._next_batch()
+                for job in batch:
+                    job.status = "running"
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        first = batch[0]
+        slots = [(job, i) for job in batch for i in job.missing]
+
+        def on_step(step, total_steps, latents):
+            # Stop the whole batch only when nobody in it still wants the result
+            if all(job.cancel_requested for job in batch):
+                raise sd_pipeline.GenerationCancelled()
+            for job in batch:
+                job.progress = step / total_steps
+            if step % PREVIEW_EVERY == 0 and step < total_steps:
+                row = 0
+                for job in batch:
+                    job.preview = sd_pipeline.latents_to_preview(latents[row])
+                    row += len(job.missing)
+
+        try:
+            images = sd_pipeline.generate_images(
+                [job.prompt for job, _ in slots],
+                first.profile, first.steps, first.guidance_scale, first.size,
+                seeds=[job.seeds[i] for job, i in slots],
+                on_step=on_step,
+            )
+            for (job, i), image in zip(slots, images):
+                buf = BytesIO()
+                image.save(buf, format="PNG")
+                job.images[i] = buf.getvalue()
+                if self.cache is not None:
+                    self.cache.set(job.cache_key(i), job.images[i])
+            for job in batch:
+                job.progress = 1.0
+                job.status = "cancelled" if job.cancel_requested else "done"
+        except sd_pipeline.GenerationCancelled:
+            for job in batch:
+                job.status = "cancelled"
+        except Exception as e:
+            print(f"Error generating batch: {e}")
+            for job in batch:
+                job.error = str(e)
+                job.status = "error"
+        finally:
+            for job in batch:
+                job.finished_at = time.time()
+
+    def _purge_finished(self):
+        cutoff = time.time() - JOB_TTL_SECONDS
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue():
+    """Returns the process-wide generation queue, starting its worker on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = GenerationQueue(cache=ImageCache(CACHE_DIR, CACHE_MAX_BYTES))
+    return _queue
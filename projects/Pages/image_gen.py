@@ -1,11 +1,11 @@
 # app.py
 import streamlit as st
-from PIL import Image, ImageDraw
+from PIL import Image
 from dotenv import load_dotenv
-from gemini_utils import get_gemini_response, configure_gemini
+from gemini_utils import get_gemini_responses, configure_gemini, MAX_CONCURRENCY
 import os
-import cv2  # For object detection
-import numpy as np
+from object_detection import detect_objects_fast, detect_objects_full, annotate_image
+from image_index import get_index, dhash, pixel_digest
 
 load_dotenv()
 if not configure_gemini():
@@ -38,41 +38,33 @@ PROMPTS = [
 ]
 
 # --- Object Detection Function (Simple Example using OpenCV) ---
-def detect_objects(image):
+def detect_objects(image, fast=True):
     try:
-        opencv_image = np.array(image) # Convert PIL image to OpenCV format
-        opencv_image = cv2.cvtColor(opencv_image, cv2.COLOR_RGB2BGR) # Convert to BGR
-
-        gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-
-        detections = []
-        for i, contour in enumerate(contours):
-                # Calculate bounding box
-                x, y, w, h = cv2.boundingRect(contour)
-                
-                # Skip detections that are too small
-                if w < 20 or h < 20:
-                    continue
-                detections.append({"box":[x,y,w,h], "label": f"object-{i+1}"})
-
-        return detections
+        if fast:
+            return detect_objects_fast(image)
+        return detect_objects_full(image)
     except Exception as e:
          st.error(f"Error performing object detection: {e}")
          return []
 
-def annotate_image(image, detections):
-    annotated_image = image.copy()
-    draw = ImageDraw.Draw(annotated_image)
-    for detection in detections:
-        x, y, w, h = detection["box"]
-        label = detection["label"]
-        draw.rectangle((x, y, x + w, y + h), outline="red", width=2)
-        draw.text((x + 5, y - 15), label, fill="red")
-    return annotated_image
+def show_result(image, response, detections, note=None):
+    """Renders the description and the annotated image for one upload."""
+    st.subheader(f"Response:")
+    if note:
+        st.caption(note)
+    if len(response) > 500:
+        with st.expander("Click to expand"):
+            st.write(response)
+    else:
+        st.write(response)
+
+    # Object Detection and Annotation
+    if detections:
+        annotated_image = annotate_image(image, detections)
+        st.subheader("Image with Annotations:")
+        st.image(annotated_image, caption="Annotated Image", use_column_width=True)
+    else:
+        st.write("No objects detected in this image.")
 
 # --- UI Elements ---
 input_option = st.selectbox("Select a prompt or enter your own:", options=["Custom"]+ PROMPTS)
@@ -83,6 +75,9 @@ else:
 
 uploaded_files = st.file_uploader("Choose images...", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
 
+fast_detection = st.checkbox("Fast object detection (works on a downscaled copy)", value=True)
+max_concurrency = st.slider("Images processed in parallel", min_value=1, max_value=8, value=min(MAX_CONCURRENCY, 8))
+
 submit = st.button("Tell me about the images")
 
 # --- Initialize containers outside of if submit so that it will not be re-rendered
@@ -94,33 +89,48 @@ if submit:
         st.error("Please upload at least one image.")
     else:
         with response_container:
+            # Lay out one section per image in upload order, then fill each one as its response arrives.
+            # Earlier uploads with identical pixels and the same prompt are answered from the image index.
+            image_index = get_index()
+            images, sources, sections = [], [], []
             for uploaded_file in uploaded_files:
                 try:
                     image = Image.open(uploaded_file)
                     st.subheader(f"Image: {uploaded_file.name}")
                     st.image(image, caption="Uploaded Image", use_column_width=True)
-
-                    with st.spinner(f"Generating description for {uploaded_file.name}..."):
-                        response = get_gemini_response(input_prompt, image)
-                        st.subheader(f"Response:")
-                        if len(response) > 500:
-                            with st.expander("Click to expand"):
-                                st.write(response)
-                        else:
-                            st.write(response)
-
-                    # Object Detection and Annotation
-                    with st.spinner(f"Detecting Objects in {uploaded_file.name}..."):
-                       detections = detect_objects(image)
-                       if detections:
-                         annotated_image = annotate_image(image, detections)
-                         st.subheader("Image with Annotations:")
-                         st.image(annotated_image, caption="Annotated Image", use_column_width=True)
-                       else:
-                         st.write("No objects detected in this image.")
+                    placeholder = st.empty()
+                    image_hash, digest = dhash(image), pixel_digest(image)
+                    stored = image_index.lookup(image_hash, digest, input_prompt)
+                    if stored and stored["fast_detection"] == fast_detection:
+                        with placeholder.container():
+                            show_result(image, stored["description"], stored["detections"],
+                                        "Reused the result of an earlier upload of the same image")
+                        continue
+                    images.append(image)
+                    sources.append(uploaded_file.getvalue())
+                    sections.append((uploaded_file.name, placeholder, image_hash, digest))
                 except Exception as e:
                     st.error(f"Error processing {uploaded_file.name}: {e}")
 
+            if images:
+                with st.spinner(f"Generating descriptions for {len(images)} image(s)..."):
+                    for index, response, payload in get_gemini_responses(input_prompt, images, max_concurrency, sources):
+                        name, placeholder, image_hash, digest = sections[index]
+                        image = images[index]
+                        try:
+                            detections = detect_objects(image, fast_detection)
+                            note = None
+                            if payload:
+                                note = f"Uploaded {payload.sent_bytes / 1024:.0f} KB instead of {payload.original_bytes / 1024:.0f} KB"
+                                image_index.add(image_hash, digest, input_prompt, {
+                                    "description": response,
+                                    "detections": detections,
+                                    "fast_detection": fast_detection,
+                                })
+                            with placeholder.container():
+                                show_result(image, response, detections, note)
+                        except Exception as e:
+                            placeholder.error(f"Error processing {name}: {e}")
 
 # FAQ Section using caching for stability
 @st.cache_data
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from PIL import Image
+
+# Stored images whose dHash differs in at most this many of 64 bits are candidates for a
+# lookup; a result is only reused when the candidate's pixels are identical (see pixel_digest).
+MAX_HAMMING_DISTANCE = int(os.getenv("IMAGE_INDEX_MAX_DISTANCE", "6"))
+MAX_ENTRIES = int(os.getenv("IMAGE_INDEX_MAX_ENTRIES", "5000"))
+DB_PATH = os.getenv("IMAGE_INDEX_DB", "image_index.db")
+
+# Bit-count lookup table for one byte, used to popcount XORed hashes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(image, hash_size=8):
+    """Returns the 64-bit difference hash of an image (robust to rescaling and re-encoding)."""
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def pixel_digest(image):
+    """
+    SHA-256 of an image's decoded RGBA pixels and size.
+
+    Independent of the file format and metadata, but unlike dhash() it changes with any
+    pixel: two copies of a worksheet with different answers written in differ here even
+    when their 64-bit dHashes are a bit apart.
+    """
+    rgba = image.convert("RGBA")
+    digest = hashlib.sha256(f"{rgba.width}x{rgba.height}".encode())
+    digest.update(rgba.tobytes())
+    return digest.hexdigest()
+
+
+def hamming_distances(hashes, target):
+    """Returns the Hamming distance between target and each hash in a uint64 array."""
+    xored = np.bitwise_xor(hashes, np.uint64(target))
+    return _POPCOUNT[xored.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class ImageIndex:
+    """
+    Persistent perceptual-hash index of processed images.
+
+    Each row stores the prompt, the image's dHash and pixel digest, and the results
+    computed for it (description and detection boxes). The coarse 64-bit dHash only
+    narrows a lookup to candidates with the same prompt within MAX_HAMMING_DISTANCE
+    bits; a stored result is returned only for a candidate with the same pixel digest,
+    since near-identical pictures (the same worksheet with different answers) can
+    hash a single bit apart. Hashes are kept in memory as a NumPy array, so finding
+    candidates is one vectorised popcount. The least recently used rows are evicted
+    past max_entries.
+    """
+
+    def __init__(self, db_path=DB_PATH, max_entries=MAX_ENTRIES, max_distance=MAX_HAMMING_DISTANCE):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_results "
+            "(id INTEGER PRIMARY KEY, prompt TEXT, phash TEXT, digest TEXT, result TEXT, last_used REAL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(image_results)")}
+        if "digest" not in columns:
+            # Rows from before pixel digests were stored cannot be verified, so they are dropped
+            self._conn.execute("DELETE FROM image_results")
+            self._conn.execute("ALTER TABLE image_results ADD COLUMN digest TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS image_results_prompt ON image_results (prompt)")
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute("SELECT id, prompt, phash, digest FROM image_results").fetchall()
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._prompts = np.array([row[1] for row in rows], dtype=object)
+        self._digests = np.array([row[3] for row in rows], dtype=object)
+        # Hashes are stored as hex text because SQLite integers are signed 64-bit
+        self._hashes = np.array([int(row[2], 16) for row in rows], dtype=np.uint64)
+
+    def lookup(self, image_hash, digest, prompt):
+        """Returns the stored result dict for an image with the same pixels and prompt, or None."""
+        with self._lock:
+            if not len(self._hashes):
+                return None
+            candidates = hamming_distances(self._hashes, image_hash) <= self.max_distance
+            candidates &= self._prompts == prompt
+            matches = np.flatnonzero(candidates & (self._digests == digest))
+            if not len(matches):
+                return None
+
+            row_id = int(self._ids[matches[0]])
+            row = self._conn.execute("SELECT result FROM image_results WHERE id = ?", (row_id,)).fetchone()
+            self._conn.execute("UPDATE image_results SET last_used = ? WHERE id = ?", (time.time(), row_id))
+            self._conn.commit()
+            return json.loads(row[0]) if row else None
+
+    def add(self, image_hash, digest, prompt, result):
+        """Stores the result dict (JSON-serialisable) for an image's dHash and pixel digest and a prompt."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO image_results (prompt, phash, digest, result, last_used) VALUES (?, ?, ?, ?, ?)",
+                (prompt, f"{image_hash:016x}", digest, json.dumps(result), time.time()),
+            )
+            self._ids = np.append(self._ids, cursor.lastrowid)
+            self._prompts = np.append(self._prompts, np.array([prompt], dtype=object))
+            self._digests = np.append(self._digests, np.array([digest], dtype=object))
+            self._hashes = np.append(self._hashes, np.uint64(image_hash))
+
+            if len(self._ids) > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM image_results WHERE id IN "
+                    "(SELECT id FROM image_results ORDER BY last_used LIMIT ?)",
+                    (len(self._ids) - self.max_entries,),
+                )
+                self._load()
+            self._conn.commit()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Returns the process-wide image index."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ImageIndex()
+    return _index
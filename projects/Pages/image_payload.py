@@ -0,0 +1,79 @@
+import io
+import os
+from collections import namedtuple
+from PIL import Image, ImageOps
+
+# Longest side of images sent to Gemini; larger uploads are downscaled.
+MAX_SIDE = int(os.getenv("GEMINI_IMAGE_MAX_SIDE", "1536"))
+# Output format ("JPEG" or "WEBP") and quality for re-encoded images.
+IMAGE_FORMAT = os.getenv("GEMINI_IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("GEMINI_IMAGE_QUALITY", "85"))
+# Uploads already within MAX_SIDE and below this size are sent unchanged.
+PASSTHROUGH_MAX_BYTES = int(os.getenv("GEMINI_IMAGE_PASSTHROUGH_KB", "1024")) * 1024
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class ImagePayload(namedtuple("ImagePayload", ["data", "mime_type", "original_bytes"])):
+    """Encoded image ready for upload, with the size of what it replaces."""
+
+    @property
+    def sent_bytes(self):
+        return len(self.data)
+
+    @property
+    def saved_bytes(self):
+        return max(0, self.original_bytes - self.sent_bytes)
+
+    def as_blob(self):
+        """Returns the inline-data part accepted by generate_content."""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+
+def prepare_image(image, source_bytes=None, max_side=MAX_SIDE, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    """
+    Shrinks an image for upload: caps the longest side, re-encodes as JPEG/WebP and drops metadata.
+
+    Args:
+        image (PIL.Image.Image): The image to send.
+        source_bytes (bytes, optional): The uploaded file. It is sent as-is when it is already a
+            small JPEG/PNG/WebP without EXIF data and within max_side.
+        max_side (int): Longest side of the encoded image.
+        image_format (str): "JPEG" or "WEBP".
+        quality (int): Encoder quality (1-100).
+
+    Returns:
+        ImagePayload: The bytes to send. original_bytes is the size of source_bytes, or of the
+        uncompressed pixels when no source is given.
+    """
+    width, height = image.size
+    original_bytes = len(source_bytes) if source_bytes else width * height * len(image.getbands())
+
+    if (source_bytes and len(source_bytes) <= PASSTHROUGH_MAX_BYTES and max(width, height) <= max_side
+            and image.format in _MIME_TYPES and "exif" not in image.info):
+        return ImagePayload(source_bytes, _MIME_TYPES[image.format], original_bytes)
+
+    # Bake the EXIF orientation into the pixels before the metadata is dropped
+    image = ImageOps.exif_transpose(image)
+    width, height = image.size
+    scale = max_side / max(width, height)
+    if scale < 1.0:
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))),
+                             Image.LANCZOS, reducing_gap=3.0)
+
+    if image_format == "JPEG" and image.mode != "RGB":
+        # JPEG has no alpha channel: flatten transparent images onto white
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+    # Saving without exif/icc_profile arguments leaves the metadata out
+    buf = io.BytesIO()
+    image.save(buf, format=image_format, quality=quality, optimize=image_format == "JPEG")
+    return ImagePayload(buf.getvalue(), _MIME_TYPES[image_format], original_bytes)
@@ -1,36 +1,17 @@
 import streamlit as st
 from dotenv import load_dotenv
-import google.generativeai as genai
-import os
-from googlesearch import search
+from gemini_utils import configure_gemini, get_model, generate_text
+from web_search import start_web_search
 
 
 load_dotenv()
 
 # --- Configure Gemini API ---
-def configure_gemini():
-    api_key = os.getenv("GOOGLE_API_KEYS")
-    if not api_key:
-        st.error("API Key not found. Please set it in the .env file.")
-        return False
-    genai.configure(api_key=api_key)
-    return True
 if not configure_gemini():
+    st.error("API Key not found. Please set it in the .env file.")
     st.stop()
 
 # --- Helper Functions ---
-def perform_web_search(query, num_results=3):
-  """Performs a web search using google search api."""
-  search_results = []
-  try:
-      for result in search(query, num_results=num_results):
-          search_results.append(result)
-  except Exception as e:
-      print(f"Error performing web search: {e}")
-      search_results = ["Error performing search"]
-  return search_results
-
-
 def generate_learning_path(interests, level="", style="", time_commitment="", include_resources=False):
     """
     Generates a personalized learning path based on user interests using the Gemini Pro model.
@@ -46,7 +27,7 @@ def generate_learning_path(interests, level="", style="", time_commitment="", in
         str: Generated learning path as a string, or an error message.
     """
     try:
-      model = genai.GenerativeModel('gemini-1.5-pro')
+      model = get_model('gemini-1.5-pro')
       prompt = f"Generate a personalized learning path for a user interested in {interests}."
       if level:
         prompt += f"The user's learning level is {level}."
@@ -54,18 +35,19 @@ def generate_learning_path(interests, level="", style="", time_commitment="", in
           prompt += f"The user's learning style is {style}."
       if time_commitment:
           prompt += f"The user has {time_commitment} hours per week for learning."
+      search_future = None
       if include_resources:
           prompt += "Include relevant links to learning resources, including YouTube tutorials."
-          
-      response = model.generate_content(prompt)
-      if include_resources:
-          response_text = response.text
-          search_prompt = f"Create links for learning resource and tutorial based on these content: {response_text}"
-          search_results = perform_web_search(search_prompt)
+          # The query only needs the interests, so the search runs while Gemini writes the path
+          search_future = start_web_search(" ".join(filter(None, [interests, level, "tutorials and courses"])))
+
+      response_text = generate_text(model, prompt)
+      if search_future:
+          search_results = search_future.result()
           response_with_resources = f"Learning Path:\n{response_text}\n\nHere are some resource links: \n{search_results}"
 
           return response_with_resources
-      return response.text
+      return response_text
 
     except Exception as e:
       return f"Error generating learning path: {e}"
@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from gemini_utils import generate_text
+from text_rank import split_sentences
+
+# Rough token budget per map call (~4 characters per token for English text).
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+CHARS_PER_TOKEN = 4
+MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+# Re-summarizing rounds after the first map step; each round must also shrink the text.
+MAX_REDUCE_LEVELS = int(os.getenv("SUMMARY_MAX_REDUCE_LEVELS", "3"))
+
+MAP_PROMPT = """You are summarizing one part of a longer lecture transcript. Write concise
+bullet points covering every concept, definition, example and conclusion in this part.
+Do not add an introduction or a conclusion. Transcript part:  """
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS, sent_tokenize=None):
+    """Splits text into chunks of whole sentences, each within max_tokens."""
+    chunks, current, current_tokens = [], [], 0
+    for sentence in split_sentences(text, sent_tokenize):
+        tokens = estimate_tokens(sentence) + 1
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def map_chunks(chunks, model, max_concurrency=MAX_CONCURRENCY, on_chunk_done=None):
+    """
+    Summarizes chunks concurrently and returns the summaries in chunk order.
+
+    Each call goes through gemini_utils.generate_text, so chunk summaries are answered from
+    the response cache when the same transcript is summarized again (for example after
+    the reduce step failed).
+    """
+    summaries = [None] * len(chunks)
+    workers = max(1, min(max_concurrency, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(generate_text, model, MAP_PROMPT + chunk): i for i, chunk in enumerate(chunks)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            summaries[futures[future]] = future.result()
+            if on_chunk_done:
+                on_chunk_done(done, len(chunks))
+    return summaries
+
+
+def summarize_long_transcript(transcript_text, final_prompt, model="gemini-pro", max_tokens=CHUNK_TOKENS,
+                              max_concurrency=MAX_CONCURRENCY, sent_tokenize=None, on_chunk_done=None,
+                              max_levels=MAX_REDUCE_LEVELS):
+    """
+    Hierarchical (map-reduce) summary of a transcript of any length.
+
+    The transcript is split into token-budgeted chunks that are summarized concurrently.
+    If the chunk summaries together still exceed the budget they are chunked and
+    summarized again, until they fit in one final call with final_prompt. At most
+    max_levels such rounds run, and only while each round shrinks the text; whatever
+    is still over budget after that is truncated, so the number of calls stays bounded.
+
+    Args:
+        transcript_text (str): The full transcript.
+        final_prompt (str): Prompt for the reduce step; the combined chunk summaries are appended.
+        model: Model name or handle for gemini_utils.generate_text.
+        max_tokens (int): Token budget per chunk.
+        max_concurrency (int): Maximum map calls in flight.
+        sent_tokenize (callable, optional): Sentence splitter used for chunking.
+        on_chunk_done (callable, optional): Called as on_chunk_done(done, total) after each map call.
+        max_levels (int): Maximum re-summarizing rounds before the final call.
+
+    Returns:
+        dict: "summary" (final text) and "chunk_summaries" (first-level summaries, in order).
+    """
+    chunks = chunk_text(transcript_text, max_tokens, sent_tokenize)
+    chunk_summaries = map_chunks(chunks, model, max_concurrency, on_chunk_done)
+
+    combined = "\n\n".join(chunk_summaries)
+    for _ in range(max_levels):
+        if estimate_tokens(combined) <= max_tokens or len(chunks) <= 1:
+            break
+        chunks = chunk_text(combined, max_tokens)
+        reduced = "\n\n".join(map_chunks(chunks, model, max_concurrency))
+        if len(reduced) >= len(combined):
+            # The model is not condensing (verbose bullets or echoed input); more rounds would not help
+            print("Chunk summaries did not shrink, stopping the reduce step early")
+            break
+        combined = reduced
+
+    if estimate_tokens(combined) > max_tokens:
+        print(f"Chunk summaries still exceed {max_tokens} tokens, truncating them for the final call")
+        combined = combined[:max_tokens * CHARS_PER_TOKEN]
+
+    return {
+        "summary": generate_text(model, final_prompt + combined),
+        "chunk_summaries": chunk_summaries,
+    }
@@ -0,0 +1,111 @@
+import functools
+import os
+import sys
+import time
+
+# NLTK data the app needs. Install it once at deploy time with:
+#   python nlp_resources.py            (or NLTK_DATA=/path python nlp_resources.py)
+# Pages never download anything at runtime.
+NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "punkt_tab": "tokenizers/punkt_tab",
+    "stopwords": "corpora/stopwords",
+}
+
+
+def download_resources(download_dir=None):
+    """Downloads every NLTK resource in NLTK_RESOURCES (deploy-time step)."""
+    import nltk
+    download_dir = download_dir or os.getenv("NLTK_DATA")
+    for name in NLTK_RESOURCES:
+        if not nltk.download(name, download_dir=download_dir, quiet=True):
+            raise RuntimeError(f"Could not download NLTK resource '{name}'")
+
+
+def missing_resources():
+    """Returns the names of required NLTK resources that are not installed (no network access)."""
+    import nltk
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+@functools.lru_cache(maxsize=None)
+def get_stop_words(language="english"):
+    """Returns the stop-word set, loaded from disk once per process."""
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words(language))
+
+
+@functools.lru_cache(maxsize=None)
+def _sentence_splitter(language="english"):
+    try:
+        from nltk.tokenize import PunktTokenizer
+        return PunktTokenizer(language).tokenize
+    except ImportError:
+        # NLTK < 3.8.2 ships the pickled model instead
+        import nltk
+        return nltk.data.load(f"tokenizers/punkt/{language}.pickle").tokenize
+
+
+def sent_tokenize(text, language="english"):
+    """Splits text into sentences with the cached Punkt model."""
+    return _sentence_splitter(language)(text)
+
+
+@functools.lru_cache(maxsize=None)
+def _word_splitter():
+    from nltk.tokenize import NLTKWordTokenizer
+    return NLTKWordTokenizer().tokenize
+
+
+def sentence_word_tokenize(sentence):
+    """Splits one already-split sentence into words, without running Punkt again."""
+    return _word_splitter()(sentence)
+
+
+def word_tokenize(text, language="english"):
+    """Splits text into words (NLTK's word_tokenize, with the cached tokenizers)."""
+    tokenize = _word_splitter()
+    return [token for sentence in sent_tokenize(text, language) for token in tokenize(sentence)]
+
+
+def benchmark(text="This is a sentence. Here is another one, with more words in it."):
+    """Times the old per-render setup (download checks + corpus load) against the cached loaders."""
+    import nltk
+    from nltk.corpus import stopwords
+    from nltk.downloader import Downloader
+
+    start = time.perf_counter()
+    downloader = Downloader()
+    nltk.download('punkt', quiet=True)
+    nltk.download('stopwords', quiet=True)
+    if not downloader.is_installed('punkt_tab'):
+        nltk.download('punkt_tab', quiet=True)
+    set(stopwords.words('english'))
+    nltk.word_tokenize(text)
+    old_setup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_stop_words()
+    word_tokenize(text)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_stop_words()
+    word_tokenize(text)
+    warm = time.perf_counter() - start
+    return {"old_per_render": old_setup, "cached_cold": cold, "cached_warm": warm}
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        for name, seconds in benchmark().items():
+            print(f"{name:>15}: {seconds * 1000:8.2f} ms")
+    else:
+        download_resources()
+        print("NLTK resources installed:", ", ".join(NLTK_RESOURCES))
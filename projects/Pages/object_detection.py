@@ -0,0 +1,205 @@
+import time
+import tracemalloc
+import cv2  # For object detection
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Longest side of the copy the fast detector works on.
+DETECTION_MAX_SIDE = 1024
+# Longest side of the annotated image shown on the page.
+ANNOTATION_MAX_SIDE = 1600
+# Boxes smaller than this (in original pixels) are ignored.
+MIN_BOX_SIZE = 20
+# Two boxes are merged when their intersection covers this share of the smaller box.
+MERGE_OVERLAP = 0.3
+# Upper bound on boxes entering the pairwise merge step (largest first).
+MAX_BOXES = 500
+
+
+def detect_objects_full(image):
+    """Edge/contour detection at the full resolution of the image (the original detector)."""
+    opencv_image = np.array(image) # Convert PIL image to OpenCV format
+    opencv_image = cv2.cvtColor(opencv_image, cv2.COLOR_RGB2BGR) # Convert to BGR
+
+    gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    detections = []
+    for i, contour in enumerate(contours):
+        # Calculate bounding box
+        x, y, w, h = cv2.boundingRect(contour)
+
+        # Skip detections that are too small
+        if w < MIN_BOX_SIZE or h < MIN_BOX_SIZE:
+            continue
+        detections.append({"box": [x, y, w, h], "label": f"object-{i+1}"})
+
+    return detections
+
+
+def detect_objects_fast(image, max_side=DETECTION_MAX_SIDE, min_size=MIN_BOX_SIZE, merge=True):
+    """
+    Edge/contour detection on a downscaled grayscale copy of the image.
+
+    Args:
+        image (PIL.Image.Image): The uploaded image, at any resolution.
+        max_side (int): Longest side of the working copy.
+        min_size (int): Minimum box width/height in original pixels.
+        merge (bool): Merge overlapping boxes into one.
+
+    Returns:
+        list: Detections as {"box": [x, y, w, h], "label": str}, in original image coordinates.
+    """
+    width, height = image.size
+    scale = min(1.0, max_side / max(width, height))
+    small = image
+    if scale < 1.0:
+        # reducing_gap lets PIL shrink by an integer factor first, which is much cheaper
+        small = image.resize((max(1, round(width * scale)), max(1, round(height * scale))),
+                             Image.BILINEAR, reducing_gap=2.0)
+    gray = np.asarray(small.convert("L"))
+
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return []
+
+    boxes = contour_boxes(contours) / scale
+    sizes = boxes[:, 2:] - boxes[:, :2]
+    boxes = boxes[(sizes >= min_size).all(axis=1)]
+    if merge and len(boxes) > 1:
+        boxes = merge_boxes(boxes)
+
+    # Largest objects first, clipped to the image
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    boxes = boxes[np.argsort(-areas)]
+    boxes = np.clip(np.rint(boxes), 0, [width, height, width, height]).astype(int)
+    return [
+        {"box": [x0, y0, x1 - x0, y1 - y0], "label": f"object-{i+1}"}
+        for i, (x0, y0, x1, y1) in enumerate(boxes.tolist())
+    ]
+
+
+def contour_boxes(contours):
+    """Returns an (N, 4) float array of [x0, y0, x1, y1] bounding boxes, one per contour."""
+    lengths = np.fromiter((len(c) for c in contours), dtype=np.intp, count=len(contours))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    points = np.concatenate(contours).reshape(-1, 2)
+    x0 = np.minimum.reduceat(points[:, 0], starts)
+    y0 = np.minimum.reduceat(points[:, 1], starts)
+    # +1 matches cv2.boundingRect, whose width counts both edge pixels
+    x1 = np.maximum.reduceat(points[:, 0], starts) + 1
+    y1 = np.maximum.reduceat(points[:, 1], starts) + 1
+    return np.stack([x0, y0, x1, y1], axis=1).astype(float)
+
+
+def merge_boxes(boxes, overlap=MERGE_OVERLAP, max_boxes=MAX_BOXES):
+    """
+    Merges boxes whose intersection covers at least `overlap` of the smaller box.
+
+    Overlapping boxes form connected groups, and each group is replaced by its union box.
+    """
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    if len(boxes) > max_boxes:
+        keep = np.argsort(-areas)[:max_boxes]
+        boxes, areas = boxes[keep], areas[keep]
+
+    ix0 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    iy0 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    ix1 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    iy1 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(ix1 - ix0, 0, None) * np.clip(iy1 - iy0, 0, None)
+    adjacency = inter >= overlap * np.minimum(areas[:, None], areas[None, :])
+
+    labels = connected_components(adjacency)
+    order = np.argsort(labels, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(labels[order]) != 0])
+    grouped = boxes[order]
+    return np.stack([
+        np.minimum.reduceat(grouped[:, 0], starts),
+        np.minimum.reduceat(grouped[:, 1], starts),
+        np.maximum.reduceat(grouped[:, 2], starts),
+        np.maximum.reduceat(grouped[:, 3], starts),
+    ], axis=1)
+
+
+def connected_components(adjacency):
+    """Labels the connected components of a boolean adjacency matrix (label propagation)."""
+    labels = np.arange(len(adjacency))
+    while True:
+        # Each node takes the smallest label among its neighbours (it is its own neighbour)
+        new_labels = np.where(adjacency, labels[None, :], len(labels)).min(axis=1)
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def annotate_image(image, detections, max_side=ANNOTATION_MAX_SIDE):
+    """Draws the detection boxes on a display-sized copy of the image."""
+    width, height = image.size
+    scale = min(1.0, max_side / max(width, height))
+    if scale < 1.0:
+        annotated_image = image.resize((round(width * scale), round(height * scale)), Image.BILINEAR, reducing_gap=2.0)
+    else:
+        annotated_image = image.copy()
+    if annotated_image.mode != "RGB":
+        annotated_image = annotated_image.convert("RGB")
+
+    draw = ImageDraw.Draw(annotated_image)
+    for detection in detections:
+        x, y, w, h = (v * scale for v in detection["box"])
+        label = detection["label"]
+        draw.rectangle((x, y, x + w, y + h), outline="red", width=2)
+        draw.text((x + 5, y - 15), label, fill="red")
+    return annotated_image
+
+
+def _synthetic_photo(width, height, seed=0):
+    """Builds a noisy test image with a few hundred filled rectangles."""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(90, 130, size=(height, width, 3), dtype=np.uint8)
+    for _ in range(300):
+        x, y = int(rng.integers(0, width - 50)), int(rng.integers(0, height - 50))
+        w, h = int(rng.integers(20, width // 6)), int(rng.integers(20, height // 6))
+        color = tuple(int(c) for c in rng.integers(0, 255, size=3))
+        cv2.rectangle(pixels, (x, y), (x + w, y + h), color, -1)
+    return Image.fromarray(pixels)
+
+
+def benchmark(sizes=((4000, 3000), (6000, 4000)), repeats=3):
+    """
+    Compares latency and peak traced memory of the full-resolution and fast detectors.
+
+    Memory is measured with tracemalloc, which sees NumPy/OpenCV output arrays but not
+    OpenCV's internal scratch buffers, so it understates both paths.
+    """
+    results = []
+    for width, height in sizes:
+        image = _synthetic_photo(width, height)
+        for name, detector in (("full", detect_objects_full), ("fast", detect_objects_fast)):
+            timings = []
+            peak = 0
+            for _ in range(repeats):
+                tracemalloc.start()
+                start = time.perf_counter()
+                detections = detector(image)
+                timings.append(time.perf_counter() - start)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            results.append({
+                "size": f"{width}x{height}",
+                "detector": name,
+                "best_ms": min(timings) * 1000,
+                "peak_mb": peak / 1e6,
+                "boxes": len(detections),
+            })
+    return results
+
+
+if __name__ == "__main__":
+    for row in benchmark():
+        print(f"{row['size']:>10} {row['detector']:>5}: {row['best_ms']:8.1f} ms, "
+              f"peak {row['peak_mb']:7.1f} MB, {row['boxes']} boxes")
@@ -1,32 +1,22 @@
 import streamlit as st
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
 import matplotlib.pyplot as plt
 import io
-import re
 import pandas as pd
 import plotly.express as px
-from googlesearch import search
+from gemini_utils import configure_gemini, get_model, generate_text
+from web_search import start_web_search
+from chart_data import GRAPH_INSTRUCTIONS, extract_graph_data, as_plot_arrays, downsample, top_categories
 
 # Load API keys from the .env file
 load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEYS")
-genai.configure(api_key=api_key)
-
-# --- Helper Functions ---
-def perform_web_search(query, num_results=3):
-    """Performs a web search using google search api."""
-    search_results = []
-    try:
-        for result in search(query, num_results=num_results):
-            search_results.append(result)
-    except Exception as e:
-        print(f"Error performing web search: {e}")
-        search_results = ["Error performing search"]
-    return search_results
+configure_gemini()
 
+# Default number of points sent to the browser per chart; larger series are downsampled.
+PLOT_MAX_POINTS = int(os.getenv("PLOT_MAX_POINTS", "2000"))
 
+# --- Helper Functions ---
 # Function to handle user queries
 def get_complex_response(question, include_graph=False, chart_type="line"):
     """
@@ -39,58 +29,49 @@ def get_complex_response(question, include_graph=False, chart_type="line"):
 
     Returns:
         explanation (str): Detailed solution to the question.
-        graph_data (dict, optional): Data for plotting the graph if requested
+        graph_data (dict, optional): NumPy 'x' and 'y' arrays for plotting the graph if requested
     """
-    model = genai.GenerativeModel("gemini-1.5-pro")
+    model = get_model("gemini-1.5-pro")
     prompt = (
         f"Question: {question}\n\n"
         f"Provide a detailed explanation with steps. "
     )
 
     if include_graph:
-        prompt += f"If the question involves numerical data or relationships suitable for visualization, extract the data needed for a {chart_type} graph (like x and y values) in a python dictionary format with keys 'x' and 'y'. If no graph is possible return an empty dictionary {{}}. Ensure that graph data is within the response and do not mention about making a graph or plotting. "
-    response = model.generate_content([prompt])
-    explanation = response.text
+        prompt += GRAPH_INSTRUCTIONS.format(chart_type=chart_type)
+    explanation = generate_text(model, [prompt])
     graph_data = {}
-    # Attempt to extract graph data if requested
+    # The graph data comes in its own fenced JSON block, parsed strictly (never eval'd)
     if include_graph:
-            try:
-                # Use regular expression to find a dictionary that might contain graph data
-                match = re.search(r"({.*?})", explanation, re.DOTALL)
-                if match:
-                    graph_data_str = match.group(0)
-                    graph_data = eval(graph_data_str)
-
-                    # remove data string from explanation
-                    explanation = explanation.replace(graph_data_str, "")
-            except Exception as e:
-                 print(f"Error while parsing graph data {e}")
-                 graph_data = {}
-
+        explanation, graph_data = extract_graph_data(explanation)
 
     return explanation.strip(), graph_data
 
 # Function to generate a plot from graph data
-def generate_plot(graph_data, chart_type):
+def generate_plot(graph_data, chart_type, max_points=PLOT_MAX_POINTS):
     """
      Generates an interactive plotly plot or matplotlib plot from the given graph data.
+     Numeric series longer than max_points are downsampled with LTTB, and categorical
+     data keeps the largest max_points - 1 categories plus an "Other" total.
     Args:
-        graph_data (dict): A dictionary containing 'x' and 'y' lists for plotting.
+        graph_data (dict): A dictionary containing 'x' and 'y' lists or arrays for plotting.
         chart_type (str): Type of chart to generate, line, bar, scatter, pie
+        max_points (int): Largest number of points or categories sent to the browser.
 
     Returns:
         streamlit plot: Plotly or matplotlib plot
     """
-    if not graph_data or 'x' not in graph_data or 'y' not in graph_data or not graph_data['x'] or not graph_data['y']:
+    if not graph_data or 'x' not in graph_data or 'y' not in graph_data or not len(graph_data['x']) or not len(graph_data['y']):
         st.write("No suitable data found for plotting.")
         return None
     try:
-        x = graph_data['x']
-        y = graph_data['y']
+        #Convert once and determine if values are numerical or categorical from the dtypes
+        x, y, numeric = as_plot_arrays(graph_data)
+        total_points = len(x)
 
-        #Determine if values are numerical or categorical
-        if all(isinstance(val, (int, float)) for val in x) and all(isinstance(val, (int, float)) for val in y):
+        if numeric:
             #Numerical values:
+            x, y = downsample(x, y, max_points)
             if chart_type == "line":
                 fig = px.line(x=x, y=y, labels={'x': 'X-axis', 'y': 'Y-axis'}, title="Generated Graph")
             elif chart_type == "scatter":
@@ -100,6 +81,7 @@ def generate_plot(graph_data, chart_type):
                  return None
         else:
             #Categorical Values:
+             x, y = top_categories(x, y, max_points)
              if chart_type == "bar":
                  fig = px.bar(x=x, y=y, labels={'x': 'X-axis', 'y': 'Y-axis'}, title="Generated Graph")
              elif chart_type == "pie":
@@ -110,6 +92,8 @@ def generate_plot(graph_data, chart_type):
 
 
         st.plotly_chart(fig) # display interactive plot
+        if len(x) < total_points:
+            st.caption(f"Showing {len(x)} of {total_points} points.")
     except Exception as e:
         st.error(f"Error generating the graph: {e}")
         return None
@@ -147,8 +131,11 @@ with col2:
                               options=["line", "bar", "scatter","pie"],
                               help="Select chart type"
                             )
+       max_points = st.slider("Max points to plot", min_value=100, max_value=20000, value=PLOT_MAX_POINTS, step=100,
+                              help="Larger series are downsampled to this many points before plotting")
     else:
         chart_type = "line" #default chart type for no graph option
+        max_points = PLOT_MAX_POINTS
 
 # Web Search Option
 include_web_search = st.checkbox("Supplement with Web Search", value=False)
@@ -159,6 +146,9 @@ if st.button("Get Solution"):
         if user_question.strip() == "":
             st.error("Please enter a question!")
         else:
+            # The web search runs in the background while Gemini works on the solution
+            search_future = start_web_search(user_question) if include_web_search else None
+
             # Fetch solution
             explanation, graph_data = get_complex_response(user_question, include_graph, chart_type)
 
@@ -169,12 +159,12 @@ if st.button("Get Solution"):
             #Display Graph
             if include_graph:
                 st.subheader("Graph")
-                generate_plot(graph_data, chart_type)
+                generate_plot(graph_data, chart_type, max_points)
 
             # web search
             if include_web_search:
                  st.subheader("Web Search Results")
-                 search_results = perform_web_search(user_question)
+                 search_results = search_future.result()
                  for result in search_results:
                       st.write(result)
 
@@ -1,70 +1,46 @@
 import streamlit as st
 import os
-import google.generativeai as genai
-from googlesearch import search
-import io
 import re
-import base64
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import time
-from deep_translator import GoogleTranslator
+from gemini_utils import configure_gemini
+from chat_session import ChatSession
+from retrieval import BM25Index, document_key, get_document_index, TOP_K
+from document_text import iter_document_pages
+import translation
+from web_search import start_web_search
 
-# Load API keys from environment variable
-os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Configure the Gemini API (once per process)
+configure_gemini()
 
 # --- Helper Functions ---
-def perform_web_search(query, num_results=3):
-    """Performs a web search using google search api."""
-    search_results = []
-    try:
-        for result in search(query, num_results=num_results):
-            search_results.append(result)
-    except Exception as e:
-        print(f"Error performing web search: {e}")
-        search_results = ["Error performing search"]
-    return search_results
-
-def get_gemini_response(question, context=None, include_web_search=False, retry_count=0, max_retries=3):
+def get_chat_session(doc_key=None):
     """
-    Gets a response from the Gemini Pro model, incorporating context
-    and optionally web search results, with retry logic.
+    Returns this user's chat session, starting a new one when the document changes.
+
+    The session lives in st.session_state, so follow-up questions continue the same
+    conversation instead of resending the document context.
     """
-    model = genai.GenerativeModel('gemini-pro')
-    chat = model.start_chat(history=[])
+    session = st.session_state.get("qa_chat")
+    if session is None or session.document_key != doc_key:
+        session = ChatSession(document_key=doc_key)
+        st.session_state.qa_chat = session
+    return session
 
-    if context:
-        question = f"Context: {context}\n\nUser Question: {question}"
-    if include_web_search:
-        search_results = perform_web_search(question)
+def get_gemini_response(question, session, passages=(), search_results=None, language="en"):
+    """
+    Gets a response from the Gemini Pro model in the user's ongoing chat session,
+    sending only document passages the conversation has not seen yet and
+    optionally web search results. Rate limiting and retries are handled by
+    the shared Gemini client. In "prompt" translation mode the model is asked
+    to answer in the selected language directly.
+    """
+    if search_results:
         question = f"Web search results are: {search_results} \n\n User question: {question}"
+    if translation.MODE == "prompt":
+        question += translation.language_instruction(language)
 
-    try:
-        response = chat.send_message(question, stream=True)
-        return response
-    except Exception as e:
-        if "429 Resource has been exhausted" in str(e) and retry_count < max_retries:
-            wait_time = 2 ** retry_count  # Exponential backoff
-            print(f"Rate limit hit. Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-            return get_gemini_response(question, context, include_web_search, retry_count + 1, max_retries)
-        else:
-            raise e  # Re-raise other exceptions
-
-def get_file_content(uploaded_file):
-    """Reads the content of an uploaded file."""
-    try:
-        if uploaded_file.name.lower().endswith(".pdf"):
-            raw_bytes = uploaded_file.read()
-            b64_pdf = base64.b64encode(raw_bytes).decode()
-            return b64_pdf
-        else:
-            stringio = io.StringIO(uploaded_file.getvalue().decode("utf-8"))
-            string_data = stringio.read()
-            return string_data
-    except Exception as e:
-        print(f"Error extracting file content: {e}")
-        return None
+    return session.ask(question, passages)
 
 def process_file_content(file_content):
     """Splits and processes file content into chunks"""
@@ -72,6 +48,39 @@ def process_file_content(file_content):
     chunks = text_splitter.split_text(file_content)
     return chunks
 
+def get_file_index(uploaded_file, on_page=None):
+    """
+    Returns the retrieval index of an uploaded file, or None if it cannot be read.
+
+    Text is extracted page by page and each page is indexed as soon as it is read,
+    so memory stays bounded on large PDFs. Indexes are cached by the hash of the file,
+    so reruns and follow-up questions on the same document do not read or index it again.
+
+    Args:
+        uploaded_file: The Streamlit upload (txt or pdf).
+        on_page (callable, optional): Called as on_page(page_number, page_count) after each page.
+    """
+    data = uploaded_file.getvalue()
+
+    def build():
+        index = BM25Index()
+        try:
+            for page_number, page_count, text in iter_document_pages(uploaded_file.name, data):
+                if text.strip():
+                    index.add(process_file_content(text))
+                if on_page:
+                    on_page(page_number, page_count)
+        except Exception as e:
+            print(f"Error extracting file content: {e}")
+            return None
+        return index
+
+    index = get_document_index(document_key(data), build)
+    return index if index is not None and len(index) else None
+
+def get_document_key(uploaded_file):
+    return document_key(uploaded_file.getvalue()) if uploaded_file else None
+
 # Streamlit App Configuration
 st.set_page_config(page_title="Q&A Demo", page_icon=":speech_balloon:", layout="wide")
 
@@ -101,18 +110,32 @@ with col2:
                             help="Select the language for the response")
 
 uploaded_file = st.file_uploader("Upload a document for context (txt/pdf)", type=["txt", "pdf"])
-file_context = None
+file_index = None
 
 if uploaded_file:
-    file_content = get_file_content(uploaded_file)
-    if file_content:
-        chunks = process_file_content(file_content)
-        file_context = " ".join(chunks)
-        st.success("Document uploaded and processed successfully")
+    progress_bar = st.empty()
+
+    def on_page(page_number, page_count):
+        progress_bar.progress(page_number / page_count, text=f"Reading page {page_number} of {page_count}")
+
+    file_index = get_file_index(uploaded_file, on_page)
+    progress_bar.empty()
+    if file_index:
+        st.success(f"Document uploaded and indexed ({len(file_index)} passages)")
+    else:
+        st.error("Could not read any text from this document.")
 
 include_web_search = st.checkbox("Supplement with Web Search", value=False)
 
-submit = st.button("Ask the question")
+col1, col2 = st.columns([1, 1])
+with col1:
+    submit = st.button("Ask the question")
+with col2:
+    if st.button("Start a new conversation"):
+        st.session_state.pop("qa_chat", None)
+
+# Seconds between re-renders of the streaming answer
+RENDER_INTERVAL = 0.15
 
 # Main container for content that will disappear when loading
 main_container = st.container()
@@ -123,24 +146,38 @@ with main_container:
         if not input:
             st.error("Please enter a question!")
         else:
+            # The search runs in the background while the document passages are retrieved
+            search_future = start_web_search(input) if include_web_search else None
             with st.spinner("Processing your question..."):
                 time.sleep(1)  # add delay
                 # Create a placeholder for streaming the response
                 response_placeholder = st.empty()
                 response_placeholder.markdown("**Waiting for response...**")
 
-                response = get_gemini_response(input, context=file_context, include_web_search=include_web_search)
-                translated_response = ""
-
-                for chunk in response:
-                    if chunk.text:
-                        translated_text = GoogleTranslator(source='auto', target=language).translate(chunk.text)
-                        translated_response += translated_text
-                        response_placeholder.markdown(f"**Response (Streaming):** {translated_response}")
+                # Only the passages most relevant to this question are sent, not the whole document
+                passages = file_index.passages_for(input, TOP_K) if file_index else ()
+                session = get_chat_session(get_document_key(uploaded_file))
+                search_results = search_future.result() if search_future else None
+                response = get_gemini_response(input, session, passages, search_results=search_results,
+                                               language=language)
+                stream = (chunk.text for chunk in response if chunk.text)
+                if translation.MODE == "translate":
+                    # Sentence-sized batches through one translator, instead of a call per streamed chunk
+                    stream = translation.translate_stream(stream, language)
+
+                parts, last_render = [], 0.0
+                for text in stream:
+                    parts.append(text)
+                    # Re-render at most every RENDER_INTERVAL, not once per chunk
+                    if time.monotonic() - last_render >= RENDER_INTERVAL:
+                        response_placeholder.markdown(f"**Response (Streaming):** {''.join(parts)}")
+                        last_render = time.monotonic()
+                translated_response = "".join(parts)
 
                 response_placeholder.empty()  # Clear the placeholder when done
                 st.subheader("The Full Response")
                 st.write(translated_response)
+                st.caption(f"Question {session.turns} of this conversation · ~{session.last_prompt_tokens} prompt tokens")
 
 # FAQ Section using caching for stability
 @st.cache_data
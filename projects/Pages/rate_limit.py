@@ -0,0 +1,130 @@
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+
+# Client-side request budget per API key and model. Set these to the quota of
+# the key in use.
+REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_RPM", "60"))
+BURST = int(os.getenv("GEMINI_BURST", "10"))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket: refills at `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """Holds back every caller of this bucket for `seconds`, e.g. after a 429."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+_buckets_lock = threading.Lock()
+_buckets = {}
+
+
+def get_bucket(api_key, model_name):
+    """Returns the process-wide bucket shared by all calls for this API key and model."""
+    key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    key = (key_id, model_name)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(REQUESTS_PER_MINUTE / 60.0, BURST)
+            _buckets[key] = bucket
+    return bucket
+
+
+def is_retryable(error):
+    """Returns True for rate-limit and transient server errors."""
+    try:
+        from google.api_core import exceptions as api_exceptions
+        if isinstance(error, (api_exceptions.TooManyRequests, api_exceptions.ResourceExhausted,
+                              api_exceptions.ServiceUnavailable, api_exceptions.InternalServerError,
+                              api_exceptions.DeadlineExceeded)):
+            return True
+    except ImportError:
+        pass
+    message = str(error)
+    return "429" in message or "Resource has been exhausted" in message or "503" in message
+
+
+def get_retry_after(error):
+    """Returns the server-suggested delay in seconds, if the error carries one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("Retry-After"):
+        try:
+            return float(headers["Retry-After"])
+        except ValueError:
+            pass
+
+    # gRPC errors carry a RetryInfo detail, which shows up in the message as
+    # "retry_delay { seconds: 12 }" or "Please retry in 12.3s".
+    message = str(error)
+    match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", message) or \
+        re.search(r"retry in ([\d.]+)\s*s", message, re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * (2 ** attempt)))
+
+
+def call_with_retry(fn, api_key, model_name, max_retries=None):
+    """
+    Calls fn() under the token bucket for (api_key, model_name), retrying transient failures.
+
+    Retries wait for the server's retry-after hint when present, otherwise for a jittered
+    exponential backoff. The wait is applied to the shared bucket, so concurrent callers
+    back off together instead of stampeding the API.
+    """
+    bucket = get_bucket(api_key, model_name)
+    retries = MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+    while True:
+        bucket.acquire()
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = get_retry_after(e)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            else:
+                delay += random.uniform(0, BASE_DELAY)
+            print(f"Gemini request for {model_name} failed ({e}). Retrying in {delay:.1f} seconds...")
+            bucket.pause(delay)
+            attempt += 1
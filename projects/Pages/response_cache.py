@@ -0,0 +1,130 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(model_key, contents):
+    """
+    Builds a content-addressed cache key for a Gemini request.
+
+    Args:
+        model_key: Anything identifying the model and its generation config (must be JSON serialisable).
+        contents: The prompt passed to generate_content - a string or a list of strings,
+            bytes and {"mime_type", "data"} blobs.
+
+    Returns:
+        str: Hex sha256 digest of the model key, the prompt text and a hash of any attached bytes.
+    """
+    if not isinstance(contents, (list, tuple)):
+        contents = [contents]
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps(model_key, sort_keys=True, default=str).encode("utf-8"))
+    for part in contents:
+        if isinstance(part, (bytes, bytearray)):
+            digest.update(b"\x00bytes:" + hashlib.sha256(part).digest())
+        elif isinstance(part, dict) and "data" in part:
+            digest.update(b"\x00blob:" + str(part.get("mime_type", "")).encode("utf-8"))
+            digest.update(hashlib.sha256(part["data"]).digest())
+        else:
+            digest.update(b"\x00text:" + str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for Gemini responses.
+
+    The first tier is a size-bounded in-memory LRU. The optional second tier is a
+    SQLite table that survives restarts. Entries in both tiers expire after ttl_seconds.
+    Each entry remembers how long the original call took, so hits can be reported as
+    saved latency as well as saved requests.
+    """
+
+    def __init__(self, max_entries=256, db_path=None, ttl_seconds=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "saved_seconds": 0.0}
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT, elapsed REAL, expires_at REAL)"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        """Returns the cached response text for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, elapsed, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._record_hit("memory_hits", elapsed)
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, elapsed, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, elapsed, expires_at = row
+                    if expires_at > now:
+                        self._remember(key, value, elapsed, expires_at)
+                        self._record_hit("disk_hits", elapsed)
+                        return value
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key, value, elapsed=0.0):
+        """Stores a response along with the time the uncached call took."""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, value, elapsed, expires_at)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, elapsed, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, value, elapsed, expires_at),
+                )
+                self._conn.commit()
+
+    def purge_expired(self):
+        """Drops expired rows from the on-disk tier."""
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def stats(self):
+        """Returns a snapshot of the hit/miss counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key, value, elapsed, expires_at):
+        self._memory[key] = (value, elapsed, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _record_hit(self, tier, elapsed):
+        self._stats["hits"] += 1
+        self._stats[tier] += 1
+        self._stats["saved_seconds"] += elapsed or 0.0
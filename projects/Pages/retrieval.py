@@ -0,0 +1,143 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+# Chunks sent to the model per question.
+TOP_K = int(os.getenv("QA_TOP_K", "4"))
+# Documents whose index is kept in memory; follow-up questions on them cost no re-indexing.
+CACHE_SIZE = int(os.getenv("QA_INDEX_CACHE_SIZE", "16"))
+# Standard BM25 parameters: term-frequency saturation and length normalisation.
+K1 = 1.5
+B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lower-case word tokens without English stop words."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in ENGLISH_STOP_WORDS]
+
+
+def document_key(data):
+    """Cache key for a document: SHA-256 of its bytes (or text)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class BM25Index:
+    """
+    BM25 index over the chunks of one document.
+
+    Chunks can be added in several calls while the document is still being read;
+    the sparse weight matrix is built on the first search after a change, so a query
+    costs one sparse column sum.
+    """
+
+    def __init__(self, chunks=(), k1=K1, b=B):
+        self.k1 = k1
+        self.b = b
+        self.chunks = []
+        self._vocabulary = {}
+        self._rows, self._cols, self._counts = [], [], []
+        self._lengths = []
+        self._weights = None
+        self._lock = threading.Lock()
+        self.add(chunks)
+
+    def add(self, chunks):
+        """Tokenises and adds chunks to the index."""
+        with self._lock:
+            for chunk in chunks:
+                row = len(self.chunks)
+                self.chunks.append(chunk)
+                tokens = tokenize(chunk)
+                self._lengths.append(len(tokens))
+                ids = np.array([self._vocabulary.setdefault(t, len(self._vocabulary)) for t in tokens], dtype=np.int64)
+                terms, counts = np.unique(ids, return_counts=True)
+                self._rows.append(np.full(len(terms), row))
+                self._cols.append(terms)
+                self._counts.append(counts)
+            self._weights = None
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def _build(self):
+        n = len(self.chunks)
+        tf = sparse.csc_matrix(
+            (np.concatenate(self._counts).astype(float),
+             (np.concatenate(self._rows), np.concatenate(self._cols))),
+            shape=(n, len(self._vocabulary)),
+        )
+        lengths = np.asarray(self._lengths, dtype=float)
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+        df = np.diff(tf.indptr)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+
+        # weight = idf * tf * (k1 + 1) / (tf + norm), computed on the non-zeros only
+        weights = tf.tocoo()
+        weights.data = idf[weights.col] * weights.data * (self.k1 + 1) / (weights.data + norm[weights.row])
+        return weights.tocsc()
+
+    def search(self, query, k=TOP_K):
+        """Returns the indices of the k chunks that best match query, best first."""
+        with self._lock:
+            if not self.chunks:
+                return []
+            if self._weights is None:
+                self._weights = self._build()
+            weights = self._weights
+            terms = list({self._vocabulary[t] for t in tokenize(query) if t in self._vocabulary})
+        if not terms:
+            return []
+        scores = np.asarray(weights[:, terms].sum(axis=1)).ravel()
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")].tolist()
+
+    def passages_for(self, query, k=TOP_K):
+        """
+        Returns the k most relevant chunks as (index, text) pairs, in document order.
+
+        Falls back to the start of the document when no chunk shares a term with the query.
+        """
+        hits = self.search(query, k) or list(range(min(k, len(self.chunks))))
+        return [(i, self.chunks[i]) for i in sorted(hits)]
+
+    def context_for(self, query, k=TOP_K):
+        """Joins the k most relevant chunks, in document order, into a context string."""
+        return "\n\n".join(text for _, text in self.passages_for(query, k))
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def get_document_index(key, build):
+    """
+    Returns the cached index for a document key, calling build() to create it on a miss
+    (a build that returns None is not cached).
+
+    Indexes are kept for the CACHE_SIZE most recently used documents, shared across sessions.
+    """
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = build()
+    if index is None:
+        return None
+    with _indexes_lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,182 @@
+import re
+import time
+import tracemalloc
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Each sentence keeps edges only to its most similar neighbours.
+TOP_K_NEIGHBOURS = 10
+# Rows of the similarity matrix computed at once; bounds memory on long transcripts.
+CHUNK_SIZE = 256
+# Auto-generated captions often have no punctuation; longer "sentences" are cut into windows.
+MAX_SENTENCE_WORDS = 60
+DAMPING = 0.85
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"\w+")
+
+
+def simple_sent_tokenize(text):
+    """Regex sentence splitter, used when no NLTK tokenizer is passed in."""
+    return [s for s in _SENTENCE_RE.split(text.strip()) if s]
+
+
+def simple_word_tokenize(sentence):
+    """Regex word splitter, used when no NLTK tokenizer is passed in."""
+    return _WORD_RE.findall(sentence)
+
+
+def split_sentences(text, sent_tokenize=None, max_words=MAX_SENTENCE_WORDS):
+    """Splits text into sentences, cutting unpunctuated runs into max_words windows."""
+    sentences = []
+    for sentence in (sent_tokenize or simple_sent_tokenize)(text):
+        words = sentence.split()
+        if len(words) <= max_words:
+            sentences.append(sentence)
+        else:
+            sentences.extend(" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words))
+    return sentences
+
+
+def tfidf_matrix(token_lists):
+    """Builds an L2-normalised sparse TF-IDF matrix (sentences x terms) from pre-tokenised sentences."""
+    vectorizer = TfidfVectorizer(analyzer=lambda tokens: tokens, sublinear_tf=True)
+    return vectorizer.fit_transform(token_lists)
+
+
+def similarity_graph(matrix, top_k=TOP_K_NEIGHBOURS, chunk_size=CHUNK_SIZE):
+    """
+    Returns a sparse, symmetric top-k cosine-similarity graph.
+
+    Similarities are computed chunk_size rows at a time and only the top_k per row are
+    kept, so memory stays O(N * top_k) instead of O(N^2).
+    """
+    n = matrix.shape[0]
+    rows, cols, values = [], [], []
+    transposed = matrix.T.tocsc()
+    for start in range(0, n, chunk_size):
+        block = (matrix[start:start + chunk_size] @ transposed).toarray()
+        block[np.arange(block.shape[0]), np.arange(start, start + block.shape[0])] = 0.0  # no self-loops
+        k = min(top_k, n - 1)
+        if k <= 0:
+            break
+        neighbours = np.argpartition(block, block.shape[1] - k, axis=1)[:, -k:]
+        weights = np.take_along_axis(block, neighbours, axis=1)
+        keep = weights > 0
+        rows.append(np.repeat(np.arange(start, start + block.shape[0]), k)[keep.ravel()])
+        cols.append(neighbours[keep])
+        values.append(weights[keep])
+
+    if not rows:
+        return sparse.csr_matrix((n, n))
+    graph = sparse.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n)
+    )
+    return graph.maximum(graph.T)
+
+
+def textrank_scores(graph, damping=DAMPING, max_iter=100, tol=1e-6):
+    """Weighted PageRank over the similarity graph (power iteration on sparse matrices)."""
+    n = graph.shape[0]
+    out_weight = np.asarray(graph.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse = np.divide(1.0, out_weight, out=np.zeros_like(out_weight), where=~dangling)
+    transition = sparse.diags(inverse) @ graph
+
+    scores = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        # Sentences with no neighbours spread their score evenly
+        new_scores = (1 - damping) / n + damping * (transition.T @ scores + scores[dangling].sum() / n)
+        if np.abs(new_scores - scores).sum() < tol:
+            return new_scores
+        scores = new_scores
+    return scores
+
+
+def select_representative_sentences(transcript_text, n_sentences=5, sent_tokenize=None, word_tokenize=None,
+                                    stop_words=(), top_k=TOP_K_NEIGHBOURS, chunk_size=CHUNK_SIZE):
+    """
+    Picks the most central sentences of a transcript with TextRank over sparse TF-IDF vectors.
+
+    Args:
+        transcript_text (str): The full transcript.
+        n_sentences (int): Number of sentences to return.
+        sent_tokenize (callable, optional): Sentence splitter (e.g. nltk.sent_tokenize).
+        word_tokenize (callable, optional): Word splitter (e.g. nltk.word_tokenize).
+        stop_words (set): Lower-case words to ignore.
+        top_k (int): Neighbours kept per sentence in the similarity graph.
+        chunk_size (int): Rows of the similarity matrix computed at once.
+
+    Returns:
+        list: The selected sentences, highest ranked first.
+    """
+    sentences = split_sentences(transcript_text, sent_tokenize)
+    if len(sentences) <= n_sentences:
+        return sentences
+
+    # One tokenisation pass; the token lists feed the TF-IDF vectoriser directly
+    word_tokenize = word_tokenize or simple_word_tokenize
+    token_lists = []
+    for sentence in sentences:
+        tokens = [token.lower() for token in word_tokenize(sentence) if token.isalnum()]
+        token_lists.append([token for token in tokens if token not in stop_words])
+    if not any(token_lists):
+        return sentences[:n_sentences]
+
+    matrix = tfidf_matrix(token_lists)
+    scores = textrank_scores(similarity_graph(matrix, top_k, chunk_size))
+    ranked = np.argsort(-scores, kind="stable")[:n_sentences]
+    return [sentences[i] for i in ranked]
+
+
+def _dense_baseline(transcript_text, n_sentences=5, stop_words=()):
+    """The previous algorithm (dense position vectors, full N x N cosine matrix), for benchmarking."""
+    from sklearn.metrics.pairwise import cosine_similarity
+    sentences = simple_sent_tokenize(transcript_text)
+    token_lists = [[t.lower() for t in simple_word_tokenize(s) if t.lower() not in stop_words] for s in sentences]
+    max_length = max(len(tokens) for tokens in token_lists)
+    matrix = np.zeros((len(sentences), max_length))
+    for i, tokens in enumerate(token_lists):
+        matrix[i, :len(tokens)] = 1
+    scores = np.sum(cosine_similarity(matrix), axis=1)
+    return [sentences[i] for i in np.argsort(scores)[::-1][:n_sentences]]
+
+
+def _synthetic_transcript(minutes, words_per_minute=150, vocabulary=4000, seed=0):
+    """Builds lecture-like text: Zipf-distributed words in 8-25 word sentences."""
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(vocabulary)]
+    ids = np.minimum(rng.zipf(1.3, size=minutes * words_per_minute), vocabulary) - 1
+    sentences, pos = [], 0
+    while pos < len(ids):
+        length = int(rng.integers(8, 26))
+        sentences.append(" ".join(words[i] for i in ids[pos:pos + length]) + ".")
+        pos += length
+    return " ".join(sentences)
+
+
+def benchmark(durations=(("1 hour", 60), ("3 hours", 180), ("10 hours", 600))):
+    """Times the sparse TextRank engine against the dense baseline on synthetic transcripts."""
+    # The most frequent synthetic words play the role of stop words
+    stop_words = {f"w{i}" for i in range(100)}
+    results = []
+    for label, minutes in durations:
+        text = _synthetic_transcript(minutes)
+        n = len(simple_sent_tokenize(text))
+        for name, select in (("dense", _dense_baseline), ("textrank", select_representative_sentences)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            select(text, stop_words=stop_words)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append({"transcript": label, "sentences": n, "engine": name,
+                            "seconds": elapsed, "peak_mb": peak / 1e6})
+    return results
+
+
+if __name__ == "__main__":
+    for row in benchmark():
+        print(f"{row['transcript']:>8} ({row['sentences']} sentences) {row['engine']:>8}: "
+              f"{row['seconds']:6.2f} s, peak {row['peak_mb']:7.1f} MB")
@@ -0,0 +1,271 @@
+import argparse
+import copy
+import json
+import os
+import queue
+import threading
+import numpy as np
+from gensim import corpora, models
+from text_rank import split_sentences, simple_word_tokenize
+
+MODEL_DIR = os.getenv("TOPIC_MODEL_DIR", "topic_model")
+NUM_TOPICS = int(os.getenv("TOPIC_NUM_TOPICS", "20"))
+# Sentences per document; single sentences are too short for LDA to learn from.
+WINDOW_SENTENCES = 5
+# Distinct videos collected before the shared model is built automatically; one video
+# is too narrow a corpus to fix the shared vocabulary.
+BOOTSTRAP_VIDEOS = int(os.getenv("TOPIC_BOOTSTRAP_VIDEOS", "20"))
+# Videos waiting to be folded in; further videos are skipped while it is full.
+UPDATE_QUEUE_SIZE = 100
+
+
+def make_documents(text, sent_tokenize=None, word_tokenize=None, stop_words=(), window=WINDOW_SENTENCES):
+    """Splits a transcript into windows of `window` sentences, each a list of content words."""
+    word_tokenize = word_tokenize or simple_word_tokenize
+    sentences = split_sentences(text, sent_tokenize)
+    documents = []
+    for start in range(0, len(sentences), window):
+        tokens = [token.lower() for sentence in sentences[start:start + window] for token in word_tokenize(sentence)]
+        tokens = [token for token in tokens if token.isalpha() and len(token) > 2 and token not in stop_words]
+        if tokens:
+            documents.append(tokens)
+    return documents
+
+
+def video_topics(documents, num_topics=3, num_words=5, passes=10):
+    """Topics from a small LDA model trained on one video's documents only (no shared model yet)."""
+    dictionary = corpora.Dictionary(documents)
+    corpus = [bow for bow in (dictionary.doc2bow(doc) for doc in documents) if bow]
+    if not corpus:
+        return []
+    model = models.LdaModel(corpus=corpus, id2word=dictionary, num_topics=num_topics,
+                            passes=passes, random_state=100)
+    return model.print_topics(num_topics=num_topics, num_words=num_words)
+
+
+class TopicService:
+    """
+    Shared online LDA topic model.
+
+    The dictionary and model are persisted in model_dir and reused for every video,
+    so a request only runs inference on the video's documents. The vocabulary is fixed
+    by refresh(), which needs a corpus of many videos: either the batch refresh below,
+    or one run automatically once bootstrap_videos distinct videos have been seen.
+    Until a shared model exists, each video gets topics from a small model trained on
+    its own documents.
+
+    Each distinct video is folded in once, by an online update on a single background
+    worker; the updated copy replaces the served model when it is done, so inference
+    never waits on training.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, num_topics=NUM_TOPICS, bootstrap_videos=BOOTSTRAP_VIDEOS):
+        self.model_dir = model_dir
+        self.num_topics = num_topics
+        self.bootstrap_videos = bootstrap_videos
+        # (dictionary, model) served to requests, swapped in one assignment
+        self._served = None
+        self._folded = set()
+        self._pending = {}  # video ID -> documents, collected until the bootstrap
+        self._queued = set()
+        self._queue = queue.Queue(maxsize=UPDATE_QUEUE_SIZE)
+        self._update_lock = threading.Lock()
+        self._worker = None
+        self._load()
+
+    @property
+    def dictionary(self):
+        return self._served[0] if self._served else None
+
+    @property
+    def model(self):
+        return self._served[1] if self._served else None
+
+    @property
+    def _dictionary_path(self):
+        return os.path.join(self.model_dir, "dictionary.gensim")
+
+    @property
+    def _model_path(self):
+        return os.path.join(self.model_dir, "lda.gensim")
+
+    @property
+    def _folded_path(self):
+        return os.path.join(self.model_dir, "folded_videos.json")
+
+    def _load(self):
+        if os.path.exists(self._folded_path):
+            try:
+                with open(self._folded_path, encoding="utf-8") as f:
+                    self._folded = set(json.load(f))
+            except Exception as e:
+                print(f"Error loading folded video list: {e}")
+        if os.path.exists(self._dictionary_path) and os.path.exists(self._model_path):
+            try:
+                self._served = (corpora.Dictionary.load(self._dictionary_path),
+                                models.LdaModel.load(self._model_path))
+            except Exception as e:
+                print(f"Error loading topic model, it will be rebuilt: {e}")
+                self._served = None
+
+    def _save(self, dictionary, model):
+        os.makedirs(self.model_dir, exist_ok=True)
+        dictionary.save(self._dictionary_path)
+        model.save(self._model_path)
+        with open(self._folded_path, "w", encoding="utf-8") as f:
+            json.dump(sorted(self._folded), f)
+
+    def topics_for(self, documents, num_topics=3, num_words=5):
+        """
+        Returns the video's strongest topics as (topic_id, "weight*word + ...") pairs.
+
+        Args:
+            documents (list): Token lists from make_documents.
+            num_topics (int): Number of topics to return.
+            num_words (int): Words shown per topic.
+        """
+        if not documents:
+            return []
+        served = self._served
+        if served is None:
+            return video_topics(documents, num_topics, num_words)
+
+        dictionary, model = served
+        bows = [bow for bow in (dictionary.doc2bow(doc) for doc in documents) if bow]
+        if not bows:
+            return video_topics(documents, num_topics, num_words)
+        gamma, _ = model.inference(bows)
+        weights = (gamma / gamma.sum(axis=1, keepdims=True)).sum(axis=0)
+        top = np.argsort(-weights)[:num_topics]
+        return [(int(topic), model.print_topic(int(topic), topn=num_words)) for topic in top]
+
+    def update(self, video_id, documents):
+        """
+        Folds a video's documents into the shared model, once per video ID.
+
+        Before the shared model exists, documents are kept until bootstrap_videos
+        videos have been seen and then used to build it with refresh().
+        """
+        with self._update_lock:
+            if video_id in self._folded or not documents:
+                return
+            if self._served is None:
+                self._pending[video_id] = documents
+                if len(self._pending) < self.bootstrap_videos:
+                    return
+                pending, self._pending = self._pending, {}
+                self._refresh(
+                    [doc for docs in pending.values() for doc in docs], folded=set(pending)
+                )
+                return
+
+            dictionary, model = self._served
+            bows = [bow for bow in (dictionary.doc2bow(doc) for doc in documents) if bow]
+            if not bows:
+                return
+            model = copy.deepcopy(model)
+            model.update(bows)
+            self._folded.add(video_id)
+            self._save(dictionary, model)
+            self._served = (dictionary, model)
+
+    def update_async(self, video_id, documents):
+        """
+        Queues update() on the single background worker.
+
+        Videos that are already folded in or queued are skipped, so repeat requests
+        for a popular video neither skew the model nor pile up work.
+        """
+        if video_id is None or video_id in self._folded or video_id in self._queued:
+            return
+        try:
+            self._queue.put_nowait((video_id, documents))
+        except queue.Full:
+            print(f"Topic update queue full, skipping video {video_id}")
+            return
+        self._queued.add(video_id)
+        with self._update_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run_updates, name="topic-update", daemon=True)
+                self._worker.start()
+
+    def _run_updates(self):
+        while True:
+            video_id, documents = self._queue.get()
+            try:
+                self.update(video_id, documents)
+            except Exception as e:
+                print(f"Error updating topic model: {e}")
+            finally:
+                self._queued.discard(video_id)
+
+    def refresh(self, documents, workers=None, passes=2, video_ids=()):
+        """
+        Rebuilds the dictionary and model from a full corpus of documents.
+
+        Args:
+            documents (list): Token lists, e.g. windows from every cached transcript.
+            workers (int, optional): Use LdaMulticore with this many workers.
+            passes (int): Training passes over the corpus.
+            video_ids (iterable): Videos the corpus came from; they are not folded in again later.
+
+        Returns:
+            bool: False if the corpus was empty and the served model was left unchanged.
+        """
+        with self._update_lock:
+            return self._refresh(documents, workers, passes, folded=video_ids)
+
+    def _refresh(self, documents, workers=None, passes=2, folded=()):
+        dictionary = corpora.Dictionary(documents)
+        if len(documents) >= 20:
+            # Stop words are already gone; only drop hapaxes and near-universal filler, since a
+            # subject that dominates the corpus still appears in most windows
+            dictionary.filter_extremes(no_below=2, no_above=0.9, keep_n=50000)
+        corpus = [bow for bow in (dictionary.doc2bow(doc) for doc in documents) if bow]
+        if not corpus:
+            return False
+        num_topics = max(1, min(self.num_topics, len(corpus)))
+        if workers and workers > 1:
+            model = models.LdaMulticore(corpus=corpus, id2word=dictionary, num_topics=num_topics,
+                                        workers=workers, passes=passes, chunksize=2000, random_state=100)
+        else:
+            model = models.LdaModel(corpus=corpus, id2word=dictionary, num_topics=num_topics,
+                                    update_every=1, passes=passes, chunksize=2000, random_state=100)
+        # A rebuilt model contains exactly the videos of its corpus
+        self._folded = set(folded)
+        self._save(dictionary, model)
+        self._served = (dictionary, model)
+        return True
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_topic_service():
+    """Returns the process-wide topic service."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TopicService()
+    return _service
+
+
+if __name__ == "__main__":
+    # Batch refresh from every transcript in the transcript store, e.g.:
+    #   python topic_service.py --workers 4
+    from gensim.parsing.preprocessing import STOPWORDS
+    from transcript_store import get_store
+
+    parser = argparse.ArgumentParser(description="Rebuild the shared topic model from cached transcripts.")
+    parser.add_argument("--workers", type=int, default=None, help="LdaMulticore workers (default: single core)")
+    parser.add_argument("--passes", type=int, default=2)
+    args = parser.parse_args()
+
+    video_ids, documents = [], []
+    for video_id, text in get_store().iter_transcripts():
+        video_ids.append(video_id)
+        documents.extend(make_documents(text, stop_words=STOPWORDS))
+    if TopicService().refresh(documents, workers=args.workers, passes=args.passes, video_ids=video_ids):
+        print(f"Trained topic model on {len(documents)} documents from {len(video_ids)} videos.")
+    else:
+        print("No usable documents in the transcript store; the topic model was not changed.")
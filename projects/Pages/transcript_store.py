@@ -0,0 +1,102 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from singleflight import SingleFlight
+
+DB_PATH = os.getenv("TRANSCRIPT_DB", "transcripts.db")
+TTL_SECONDS = int(os.getenv("TRANSCRIPT_TTL", str(7 * 24 * 3600)))
+# Directory of <video_id>.txt / <video_id>.json files to use instead of YouTube (tests, offline demos).
+FIXTURE_DIR = os.getenv("TRANSCRIPT_FIXTURE_DIR")
+
+
+def youtube_fetcher(video_id):
+    """Downloads a transcript from YouTube and joins its segments into one string."""
+    from youtube_transcript_api import YouTubeTranscriptApi
+    segments = YouTubeTranscriptApi.get_transcript(video_id)
+    return " ".join(segment["text"] for segment in segments)
+
+
+def fixture_fetcher(directory):
+    """Returns a fetcher that reads transcripts from local files instead of YouTube."""
+    def fetch(video_id):
+        text_path = os.path.join(directory, f"{video_id}.txt")
+        if os.path.exists(text_path):
+            with open(text_path, encoding="utf-8") as f:
+                return f.read()
+        # Same shape as YouTubeTranscriptApi.get_transcript: a list of {"text", ...} segments
+        with open(os.path.join(directory, f"{video_id}.json"), encoding="utf-8") as f:
+            return " ".join(segment["text"] for segment in json.load(f))
+    return fetch
+
+
+class TranscriptStore:
+    """
+    Persistent transcript cache keyed by video ID.
+
+    Transcripts are kept in SQLite for ttl_seconds. Concurrent requests for a video
+    that is not cached share one in-flight fetch.
+    """
+
+    def __init__(self, db_path=DB_PATH, ttl_seconds=TTL_SECONDS, fetcher=youtube_fetcher):
+        self.ttl_seconds = ttl_seconds
+        self.fetcher = fetcher
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts (video_id TEXT PRIMARY KEY, transcript TEXT, fetched_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, video_id):
+        """Returns the transcript for video_id, fetching it if it is missing or expired."""
+        transcript = self._read(video_id)
+        if transcript is not None:
+            return transcript
+        return self._flights.do(video_id, lambda: self._fetch(video_id))
+
+    def iter_transcripts(self):
+        """Yields (video_id, transcript) for every stored transcript that has not expired (used for batch jobs)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT video_id, transcript FROM transcripts WHERE fetched_at > ?", (time.time() - self.ttl_seconds,)
+            ).fetchall()
+        yield from rows
+
+    def _read(self, video_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT transcript, fetched_at FROM transcripts WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        if row and row[1] + self.ttl_seconds > time.time():
+            return row[0]
+        return None
+
+    def _fetch(self, video_id):
+        # Another caller may have stored it between our read and becoming the leader
+        transcript = self._read(video_id)
+        if transcript is not None:
+            return transcript
+        transcript = self.fetcher(video_id)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts (video_id, transcript, fetched_at) VALUES (?, ?, ?)",
+                (video_id, transcript, time.time()),
+            )
+            self._conn.commit()
+        return transcript
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Returns the process-wide transcript store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            fetcher = fixture_fetcher(FIXTURE_DIR) if FIXTURE_DIR else youtube_fetcher
+            _store = TranscriptStore(fetcher=fetcher)
+    return _store
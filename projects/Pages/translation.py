@@ -0,0 +1,97 @@
+import functools
+import os
+import re
+
+# "prompt": Gemini answers in the selected language, nothing is translated afterwards.
+# "translate": Gemini answers in English and the stream is translated in sentence batches.
+MODE = os.getenv("QA_TRANSLATION_MODE", "prompt")
+# Text buffered before a translation call; it is flushed at the last sentence boundary.
+BATCH_CHARS = int(os.getenv("QA_TRANSLATION_BATCH_CHARS", "600"))
+# deep_translator rejects texts of 5000 characters or more.
+MAX_CHARS = 4500
+
+LANGUAGE_NAMES = {"en": "English", "es": "Spanish", "fr": "French", "de": "German", "hi": "Hindi"}
+
+_BOUNDARY_RE = re.compile(r"[.!?।。！？]['\")\]]*\s+|\n\s*")
+
+
+def needs_translation(language):
+    return language != "en"
+
+
+def language_instruction(language):
+    """Prompt suffix that makes the model answer in language ("" for English)."""
+    if not needs_translation(language):
+        return ""
+    return f"\n\nWrite your entire answer in {LANGUAGE_NAMES.get(language, language)}."
+
+
+@functools.lru_cache(maxsize=None)
+def get_translator(target):
+    """Returns one GoogleTranslator per target language, reused across requests."""
+    from deep_translator import GoogleTranslator
+    return GoogleTranslator(source="auto", target=target)
+
+
+class EchoTranslator:
+    """Local stand-in translator: returns the text unchanged and records each call (for tests)."""
+
+    def __init__(self):
+        self.calls = []
+
+    def translate(self, text):
+        self.calls.append(text)
+        return text
+
+
+def _split_point(buffer, limit):
+    """Index just past the last sentence boundary in buffer[:limit], or 0 if there is none."""
+    end = 0
+    for match in _BOUNDARY_RE.finditer(buffer, 0, limit):
+        end = match.end()
+    return end
+
+
+def translate_stream(chunks, target, translator=None, batch_chars=BATCH_CHARS):
+    """
+    Translates a stream of text chunks in sentence-aligned batches.
+
+    Chunks are buffered until at least batch_chars have arrived, then everything up to
+    the last sentence boundary is translated in one call. This takes one call per
+    batch instead of one per streamed chunk, and sentences are never cut in half.
+    Whitespace at each cut is kept as is, so line breaks survive translation.
+
+    Args:
+        chunks (iterable): Streamed text pieces.
+        target (str): Target language code; "en" passes the text through untouched.
+        translator (optional): Object with translate(text). Defaults to get_translator(target).
+        batch_chars (int): Minimum characters per translation call.
+
+    Yields:
+        str: Translated text, in order.
+    """
+    if not needs_translation(target):
+        yield from chunks
+        return
+    translator = translator or get_translator(target)
+
+    def translate(text):
+        stripped = text.rstrip()
+        if not stripped.strip():
+            return text
+        return (translator.translate(stripped) or stripped) + text[len(stripped):]
+
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= batch_chars:
+            cut = _split_point(buffer, min(len(buffer), MAX_CHARS))
+            if not cut:
+                if len(buffer) < MAX_CHARS:
+                    break
+                # No sentence boundary in a very long run: cut at the last space instead
+                cut = buffer.rfind(" ", 0, MAX_CHARS) + 1 or MAX_CHARS
+            yield translate(buffer[:cut])
+            buffer = buffer[cut:]
+    if buffer:
+        yield translate(buffer)
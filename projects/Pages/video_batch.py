@@ -0,0 +1,222 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse, parse_qs
+from transcript_store import get_store
+
+# Videos summarized at once; each worker's Gemini calls still go through the shared rate limiter.
+MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+# Upper bound on videos per batch, so one paste cannot queue an entire channel.
+MAX_VIDEOS = int(os.getenv("BATCH_MAX_VIDEOS", "200"))
+
+_VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_PLAYLIST_ID_RE = re.compile(r"^(PL|UU|LL|FL|OL|RD)[A-Za-z0-9_-]{10,}$")
+_PLAYLIST_ITEM_RE = re.compile(r'"playlistVideoRenderer":\{"videoId":"([A-Za-z0-9_-]{11})"')
+_YOUTUBE_HOSTS = ("youtube.com", "youtube-nocookie.com", "youtu.be")
+# Paths whose next segment is the video ID, e.g. /shorts/<id> or /embed/<id>
+_ID_PATH_PREFIXES = ("shorts", "embed", "live", "v", "e")
+_CSV_URL_COLUMNS = ("url", "link", "video", "video_id", "video_url", "youtube", "id")
+
+
+def _youtube_url(value):
+    url = urlparse(value if "://" in value else "https://" + value)
+    host = url.netloc.lower().split(":")[0]
+    if any(host == h or host.endswith("." + h) for h in _YOUTUBE_HOSTS):
+        return url, host
+    return None, None
+
+
+def parse_video_id(value, allow_bare_id=True):
+    """
+    Returns the 11-character video ID in a YouTube URL or bare ID, or None.
+
+    Handles watch?v= URLs with extra parameters, youtu.be short links, /shorts/,
+    /embed/ and /live/ paths, and mobile or music subdomains. With allow_bare_id=False
+    only URLs are accepted, since any 11-character word (e.g. "Programming") looks
+    like an ID.
+    """
+    value = value.strip()
+    if allow_bare_id and _VIDEO_ID_RE.match(value):
+        return value
+    url, host = _youtube_url(value)
+    if url is None:
+        return None
+    parts = [part for part in url.path.split("/") if part]
+    if host.endswith("youtu.be"):
+        candidate = parts[0] if parts else None
+    elif len(parts) >= 2 and parts[0] in _ID_PATH_PREFIXES:
+        candidate = parts[1]
+    else:
+        candidate = parse_qs(url.query).get("v", [None])[0]
+    if candidate and _VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def parse_playlist_id(value, allow_bare_id=True):
+    """Returns the playlist ID of a playlist URL or bare playlist ID (if allowed), or None."""
+    value = value.strip()
+    if allow_bare_id and _PLAYLIST_ID_RE.match(value):
+        return value
+    url, _ = _youtube_url(value)
+    if url is None:
+        return None
+    playlist_id = parse_qs(url.query).get("list", [None])[0]
+    return playlist_id if playlist_id and _PLAYLIST_ID_RE.match(playlist_id) else None
+
+
+def playlist_video_ids(playlist_id):
+    """
+    Lists the videos of a public playlist from its YouTube page.
+
+    Only the first page of the playlist (about 100 videos) is embedded in the HTML.
+    """
+    import requests
+    response = requests.get("https://www.youtube.com/playlist", params={"list": playlist_id},
+                            headers={"Accept-Language": "en"}, timeout=15)
+    response.raise_for_status()
+    return list(dict.fromkeys(_PLAYLIST_ITEM_RE.findall(response.text)))
+
+
+def _csv_values(data):
+    """Returns the cells of the URL/ID column of a CSV file (the first column if there is no header)."""
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig", errors="replace")
+    rows = [row for row in csv.reader(io.StringIO(data)) if row]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((header.index(name) for name in _CSV_URL_COLUMNS if name in header), None)
+    if column is None:
+        return [row[0] for row in rows]
+    return [row[column] for row in rows[1:] if len(row) > column]
+
+
+def collect_video_ids(text="", csv_data=None, expand_playlist=playlist_video_ids, max_videos=MAX_VIDEOS):
+    """
+    Parses pasted links and an optional CSV upload into an ordered, de-duplicated list of video IDs.
+
+    Args:
+        text (str): Video or playlist links, separated by newlines, spaces or commas. A bare
+            ID is only accepted on a line of its own, so words in pasted prose are not taken for IDs.
+        csv_data (bytes or str, optional): CSV with a url/link/video_id column, or links in the first
+            column. Each cell is treated like a line.
+        expand_playlist (callable): Returns the video IDs of a playlist ID.
+        max_videos (int): Maximum number of video IDs returned.
+
+    Returns:
+        tuple: (video_ids, problems), where problems lists the inputs that could not be used.
+    """
+    lines = (text or "").splitlines()
+    if csv_data:
+        lines += _csv_values(csv_data)
+    # (token, whether it may be a bare ID): only when it is the whole line
+    values = []
+    for line in lines:
+        tokens = [token for token in re.split(r"[\s,]+", line) if token]
+        values += [(token, len(tokens) == 1) for token in tokens]
+
+    video_ids, problems = {}, []
+    for value, allow_bare_id in values:
+        playlist_id = parse_playlist_id(value, allow_bare_id)
+        video_id = parse_video_id(value, allow_bare_id)
+        if video_id:
+            # A watch URL inside a playlist means just that video
+            video_ids[video_id] = None
+        elif playlist_id:
+            try:
+                for item in expand_playlist(playlist_id):
+                    video_ids[item] = None
+            except Exception as e:
+                problems.append(f"{value}: could not read playlist ({e})")
+        else:
+            problems.append(f"{value}: not a YouTube video or playlist link")
+
+    video_ids = list(video_ids)
+    if len(video_ids) > max_videos:
+        problems.append(f"Only the first {max_videos} of {len(video_ids)} videos are summarized")
+        video_ids = video_ids[:max_videos]
+    return video_ids, problems
+
+
+def summarize_videos(video_ids, summarize, fetch_transcript=None, max_workers=MAX_WORKERS):
+    """
+    Fetches and summarizes videos on a worker pool, yielding each result as soon as it is done.
+
+    Args:
+        video_ids (list): Video IDs to summarize.
+        summarize (callable): Called as summarize(transcript, video_id); returns the video's notes.
+        fetch_transcript (callable, optional): Returns the transcript of a video ID.
+            Defaults to the shared transcript store.
+        max_workers (int): Videos processed at once.
+
+    Yields:
+        dict: "video_id", "position" (index in video_ids), "seconds" and either "notes" or "error";
+        one video failing does not stop the batch.
+    """
+    fetch_transcript = fetch_transcript or get_store().get
+
+    def run(position, video_id):
+        start = time.perf_counter()
+        result = {"video_id": video_id, "position": position}
+        try:
+            transcript = fetch_transcript(video_id)
+            if not transcript:
+                raise ValueError("empty transcript")
+            result["notes"] = summarize(transcript, video_id)
+        except Exception as e:
+            result["error"] = str(e)
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    if not video_ids:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(video_ids)))) as executor:
+        futures = [executor.submit(run, i, video_id) for i, video_id in enumerate(video_ids)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def notes_markdown(video_id, notes):
+    """Renders one video's notes as a Markdown document."""
+    lines = [f"# Notes for https://www.youtube.com/watch?v={video_id}", "",
+             "## Abstractive Summary", "", str(notes["abstractive_summary"]), "",
+             "## Representative Sentences", ""]
+    lines += [f"- {sentence}" for sentence in notes["representative_sentences"]]
+    lines += ["", "## Key Topics", ""]
+    lines += [f"- Topic {topic_id}: {words}" for topic_id, words in notes["topics"]]
+    if notes.get("entities"):
+        lines += ["", "## Named Entities", ""]
+        lines += [f"- {entity}" for entity in notes["entities"]]
+    return "\n".join(lines) + "\n"
+
+
+def make_bundle(results):
+    """
+    Packs batch results into a zip: one Markdown file per video, an index.csv with the
+    status of every video, and results.json with everything in machine-readable form.
+    Videos are listed in input order, whatever order they finished in.
+    """
+    results = sorted(results, key=lambda result: result.get("position", 0))
+    buffer = io.BytesIO()
+    index = io.StringIO()
+    writer = csv.writer(index)
+    writer.writerow(["video_id", "url", "status", "seconds", "file"])
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as bundle:
+        for result in results:
+            video_id = result["video_id"]
+            url = f"https://www.youtube.com/watch?v={video_id}"
+            if "notes" in result:
+                name = f"{video_id}.md"
+                bundle.writestr(name, notes_markdown(video_id, result["notes"]))
+                writer.writerow([video_id, url, "ok", f"{result['seconds']:.1f}", name])
+            else:
+                writer.writerow([video_id, url, f"error: {result['error']}", f"{result['seconds']:.1f}", ""])
+        bundle.writestr("index.csv", index.getvalue())
+        bundle.writestr("results.json", json.dumps(results, indent=2, default=str))
+    return buffer.getvalue()
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from singleflight import SingleFlight
+
+TTL_SECONDS = int(os.getenv("WEB_SEARCH_TTL", "3600"))
+MAX_ENTRIES = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "512"))
+# Searches running in the background at once (shared by every session).
+MAX_WORKERS = int(os.getenv("WEB_SEARCH_WORKERS", "4"))
+ERROR_RESULTS = ["Error performing search"]
+
+
+def google_backend(query, num_results):
+    """Searches with googlesearch-python and returns the result URLs."""
+    from googlesearch import search
+    return list(search(query, num_results=num_results))
+
+
+def static_backend(results):
+    """Returns a local backend that answers every query with results (for tests and offline demos)."""
+    def search(query, num_results):
+        return list(results)[:num_results]
+    return search
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a query, used as the cache key."""
+    return " ".join(query.lower().split())
+
+
+class WebSearch:
+    """
+    Shared web-search service.
+
+    Results are cached by normalised query for ttl_seconds, concurrent identical
+    queries share one backend call, and search_async() runs a search on a background
+    pool so pages can overlap it with their Gemini call. Failed searches are not cached.
+    """
+
+    def __init__(self, backend=google_backend, ttl_seconds=TTL_SECONDS, max_entries=MAX_ENTRIES,
+                 max_workers=MAX_WORKERS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="web-search")
+
+    def search(self, query, num_results=3):
+        """Returns up to num_results result URLs for query (ERROR_RESULTS if the search fails)."""
+        key = (normalize_query(query), num_results)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > time.time():
+                self._cache.move_to_end(key)
+                return list(entry[1])
+        try:
+            results = self._flights.do(key, lambda: self._search(key, query, num_results))
+        except Exception as e:
+            print(f"Error performing web search: {e}")
+            return list(ERROR_RESULTS)
+        return list(results)
+
+    def search_async(self, query, num_results=3):
+        """Starts search() in the background and returns a Future with its results."""
+        return self._executor.submit(self.search, query, num_results)
+
+    def _search(self, key, query, num_results):
+        results = self.backend(query, num_results)
+        with self._lock:
+            self._cache[key] = (time.time() + self.ttl_seconds, results)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return results
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_web_search():
+    """Returns the process-wide web-search service."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = WebSearch()
+    return _service
+
+
+def perform_web_search(query, num_results=3):
+    """Performs a cached web search with the shared service."""
+    return get_web_search().search(query, num_results)
+
+
+def start_web_search(query, num_results=3):
+    """Starts a cached web search in the background; call .result() on the returned Future."""
+    return get_web_search().search_async(query, num_results)